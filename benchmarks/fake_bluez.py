@@ -0,0 +1,413 @@
+"""Stand-in BlueZ service for benchmarks and tests.
+
+Publishes org.bluez with ObjectManager, Adapter1, Device1, MediaPlayer1 and
+MediaTransport1 objects, served by dbus-fast on its own thread. Run as a
+script it uses whatever bus DBUS_SYSTEM_BUS_ADDRESS points to, normally a
+private dbus-daemon started by benchmarks/run.py. Never run it against the
+real system bus. The tests start it in-process on their own dbus-daemon.
+
+    python benchmarks/fake_bluez.py --devices 100 --signal-rate 200
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import threading
+
+from dbus_fast import BusType, DBusError, PropertyAccess, Variant
+from dbus_fast.aio import MessageBus
+from dbus_fast.service import ServiceInterface, dbus_property, method
+
+logger = logging.getLogger("fake_bluez")
+
+bluez_service = "org.bluez"
+adapter_path = "/org/bluez/hci0"
+
+A2DP_SOURCE_UUID = "0000110a-0000-1000-8000-00805f9b34fb"
+SBC_44100_JOINT_STEREO = bytes([0x21, 0x15, 2, 53])
+
+READ = PropertyAccess.READ
+READWRITE = PropertyAccess.READWRITE
+
+adapter_properties = {
+    "Address": ("s", READ),
+    "Name": ("s", READ),
+    "Alias": ("s", READWRITE),
+    "Powered": ("b", READWRITE),
+    "Discoverable": ("b", READWRITE),
+    "Pairable": ("b", READWRITE),
+    "Discovering": ("b", READ),
+}
+device_properties = {
+    "Address": ("s", READ),
+    "Name": ("s", READ),
+    "Alias": ("s", READWRITE),
+    "Icon": ("s", READ),
+    "Class": ("u", READ),
+    "Paired": ("b", READ),
+    "Bonded": ("b", READ),
+    "Trusted": ("b", READWRITE),
+    "Connected": ("b", READ),
+    "Adapter": ("o", READ),
+    "UUIDs": ("as", READ),
+}
+player_properties = {
+    "Status": ("s", READ),
+    "Position": ("u", READ),
+    "Track": ("a{sv}", READ),
+    "Name": ("s", READ),
+    "Type": ("s", READ),
+    "Device": ("o", READ),
+}
+transport_properties = {
+    "Device": ("o", READ),
+    "UUID": ("s", READ),
+    "Codec": ("y", READ),
+    "Configuration": ("ay", READ),
+    "State": ("s", READ),
+    "Volume": ("q", READWRITE),
+}
+
+
+def track_variant(track):
+    return {key: Variant("s" if isinstance(value, str) else "u", value)
+            for key, value in track.items()}
+
+
+def _property(name, signature, access):
+    """A dbus-fast property reading and writing self.values[name]"""
+    def getter(self):
+        value = self.values[name]
+        return track_variant(value) if name == "Track" else value
+
+    getter.__name__ = name
+    getter.__annotations__ = {"return": signature}
+    prop = dbus_property(access=access)(getter)
+    if access is READWRITE:
+        def setter(self, value):
+            self.update(**{name: value})
+
+        # dbus-fast writes through setattr with the setter's name
+        setter.__name__ = name
+        setter.__annotations__ = {"value": signature}
+        prop = prop.setter(setter)
+    return prop
+
+
+def properties(table):
+    """Class decorator adding a D-Bus property for every table entry"""
+    def decorate(cls):
+        for name, (signature, access) in table.items():
+            setattr(cls, name, _property(name, signature, access))
+        return cls
+    return decorate
+
+
+class FakeObject(ServiceInterface):
+    """Published interface whose D-Bus properties live in a dict.
+
+    Method calls are recorded in calls, property updates are signalled
+    with PropertiesChanged like BlueZ does.
+    """
+
+    interface = None
+
+    def __init__(self, service, path, **values):
+        super().__init__(self.interface)
+        self.service = service
+        self.path = path
+        self.values = values
+        self.calls = []
+
+    def update(self, **changed):
+        self.values.update(changed)
+        self.emit_properties_changed({
+            name: track_variant(value) if name == "Track" else value
+            for name, value in changed.items()
+        })
+
+
+@properties(adapter_properties)
+class Adapter(FakeObject):
+    interface = "org.bluez.Adapter1"
+
+    @method()
+    def StartDiscovery(self):
+        self.calls.append(("StartDiscovery",))
+        self.update(Discovering=True)
+        self.service.start_discovery()
+
+    @method()
+    def StopDiscovery(self):
+        self.calls.append(("StopDiscovery",))
+        self.update(Discovering=False)
+
+    @method()
+    def RemoveDevice(self, device: "o"):
+        self.calls.append(("RemoveDevice", device))
+        if not self.service.remove_device(device):
+            raise DBusError("org.bluez.Error.DoesNotExist", "Does Not Exist")
+
+    @method()
+    def SetDiscoveryFilter(self, scan_filter: "a{sv}"):
+        scan_filter = {key: value.value for key, value in scan_filter.items()}
+        self.calls.append(("SetDiscoveryFilter", scan_filter))
+        self.service.discovery_filter = scan_filter
+
+
+@properties(device_properties)
+class Device(FakeObject):
+    interface = "org.bluez.Device1"
+
+    def __init__(self, service, path, fail_connect=False, **values):
+        super().__init__(service, path, **values)
+        self.fail_connect = fail_connect
+
+    @method()
+    async def Connect(self):
+        self.calls.append(("Connect",))
+        if self.service.connect_delay:
+            await asyncio.sleep(self.service.connect_delay)
+        if self.fail_connect:
+            raise DBusError("org.bluez.Error.Failed", "Page Timeout")
+        self.service.connect_device(self.path)
+
+    @method()
+    def Disconnect(self):
+        self.calls.append(("Disconnect",))
+        self.service.disconnect_device(self.path)
+
+
+@properties({"RSSI": ("n", READ)})
+class ScannedDevice(Device):
+    """Device1 seen by a scan, only those report RSSI"""
+
+
+@properties(player_properties)
+class Player(FakeObject):
+    interface = "org.bluez.MediaPlayer1"
+
+    @method()
+    def Play(self):
+        self.calls.append(("Play",))
+        self.update(Status="playing")
+
+    @method()
+    def Pause(self):
+        self.calls.append(("Pause",))
+        self.update(Status="paused")
+
+    @method()
+    def Stop(self):
+        self.calls.append(("Stop",))
+        self.update(Status="stopped", Position=0)
+
+    @method()
+    def Next(self):
+        self.calls.append(("Next",))
+        self.service.next_track(self)
+
+    @method()
+    def Previous(self):
+        self.calls.append(("Previous",))
+        self.service.next_track(self)
+
+
+@properties(transport_properties)
+class Transport(FakeObject):
+    interface = "org.bluez.MediaTransport1"
+
+
+class FakeBluez():
+    """Fake bluetoothd with a configurable device count and signal rate.
+
+    start() connects to the bus at address, or the system bus, and serves
+    on a new thread. Everything else has to run on that thread, call it
+    through run() from outside.
+    """
+
+    def __init__(
+            self, address=None, devices=100, signal_rate=0, discovery_devices=5,
+            discovery_delay=0.2, connect_delay=0.0, connected=True):
+        self.address = address
+        self.objects = {}
+        self.signal_rate = signal_rate
+        self.discovery_devices = discovery_devices
+        self.discovery_delay = discovery_delay
+        self.connect_delay = connect_delay
+        self.discovery_filter = None
+        self.bus = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="FakeBluez", daemon=True)
+        self._devices = devices
+        self._connected = connected
+        self._counter = itertools.count()
+        self._track_counter = itertools.count(1)
+        self.adapter = None
+
+    def start(self):
+        self.thread.start()
+        self.run(self._start())
+
+    def stop(self):
+        self.run(self.bus.disconnect)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+    def run(self, coro_or_fn, *args, **kwargs):
+        """Runs a coroutine or a function on the service thread and waits for it"""
+        if not asyncio.iscoroutine(coro_or_fn):
+            fn = coro_or_fn
+
+            async def call():
+                return fn(*args, **kwargs)
+
+            coro_or_fn = call()
+        return asyncio.run_coroutine_threadsafe(coro_or_fn, self.loop).result(timeout=10)
+
+    async def _start(self):
+        self.bus = await MessageBus(bus_address=self.address, bus_type=BusType.SYSTEM).connect()
+        self.adapter = self._register(Adapter(
+            self, adapter_path,
+            Address="00:00:00:00:00:01", Name="fake", Alias="fake",
+            Powered=True, Discoverable=False, Pairable=False, Discovering=False,
+        ))
+        for _ in range(self._devices):
+            self.add_device(paired=True)
+        if self._connected and self._devices:
+            self.connect_device(self.device_paths()[0])
+        await self.bus.request_name(bluez_service)
+
+    def device_paths(self):
+        return [path for path, obj in self.objects.items() if isinstance(obj, Device)]
+
+    def add_device(self, paired=False, rssi=None, fail_connect=False):
+        index = next(self._counter)
+        address = "02:00:00:{:02X}:{:02X}:{:02X}".format(
+            (index >> 16) & 0xFF, (index >> 8) & 0xFF, index & 0xFF
+        )
+        path = f"{adapter_path}/dev_{address.replace(':', '_')}"
+        values = dict(
+            Address=address, Name=f"Phone {index}", Alias=f"Phone {index}",
+            Icon="phone", Class=0x5a020c, Paired=paired, Bonded=paired,
+            Trusted=paired, Connected=False, Adapter=adapter_path,
+            UUIDs=[A2DP_SOURCE_UUID],
+        )
+        if rssi is None:
+            device = Device(self, path, fail_connect=fail_connect, **values)
+        else:
+            device = ScannedDevice(self, path, fail_connect=fail_connect, RSSI=rssi, **values)
+        return self._register(device)
+
+    def remove_device(self, path):
+        """Removes a device, returns False if there is none at path"""
+        if not isinstance(self.objects.get(path), Device):
+            return False
+        self.disconnect_device(path)
+        self._unregister(path)
+        return True
+
+    def connect_device(self, path):
+        device = self.objects[path]
+        if device.values["Connected"]:
+            return
+        device.update(Connected=True)
+        self._register(Transport(
+            self, f"{path}/fd0",
+            Device=path, UUID=A2DP_SOURCE_UUID, Codec=0,
+            Configuration=SBC_44100_JOINT_STEREO, State="active", Volume=64,
+        ))
+        self._register(Player(
+            self, f"{path}/player0",
+            Status="playing", Position=0, Name="Music", Type="Audio", Device=path,
+            Track=self._track(),
+        ))
+
+    def disconnect_device(self, path):
+        device = self.objects.get(path)
+        if device is None or not device.values["Connected"]:
+            return
+        for child in (f"{path}/player0", f"{path}/fd0"):
+            self._unregister(child)
+        device.update(Connected=False)
+
+    def next_track(self, player):
+        player.update(Track=self._track(), Position=0)
+
+    def start_discovery(self):
+        for i in range(self.discovery_devices):
+            self.loop.call_later(
+                self.discovery_delay * (i + 1),
+                lambda: self.add_device(rssi=-40 - random.randint(0, 50)),
+            )
+
+    def start_signals(self):
+        """Emits PropertiesChanged at signal_rate per second"""
+        if not self.signal_rate:
+            return
+        self.loop.call_soon_threadsafe(self._emit_signal)
+
+    def _emit_signal(self):
+        self.loop.call_later(1 / self.signal_rate, self._emit_signal)
+        players = [obj for obj in self.objects.values() if isinstance(obj, Player)]
+        transports = [obj for obj in self.objects.values() if isinstance(obj, Transport)]
+        # Only devices already seen by a scan report RSSI, so background load
+        # does not make paired devices show up in discovery sessions
+        devices = [obj for obj in self.objects.values() if isinstance(obj, ScannedDevice)]
+        choice = random.random()
+        if players and choice < 0.4:
+            player = random.choice(players)
+            player.update(Position=player.values["Position"] + 1000)
+        elif players and choice < 0.5:
+            self.next_track(random.choice(players))
+        elif transports and choice < 0.7:
+            random.choice(transports).update(Volume=random.randint(0, 127))
+        elif devices:
+            random.choice(devices).update(RSSI=-40 - random.randint(0, 50))
+
+    def _track(self):
+        number = next(self._track_counter)
+        return {
+            "Title": f"Track {number}", "Artist": "Artist", "Album": "Album",
+            "TrackNumber": number, "Duration": 180000,
+        }
+
+    def _register(self, obj):
+        # Exporting announces the object with InterfacesAdded
+        self.bus.export(obj.path, obj)
+        self.objects[obj.path] = obj
+        return obj
+
+    def _unregister(self, path):
+        if self.objects.pop(path, None) is not None:
+            self.bus.unexport(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--signal-rate", type=float, default=0)
+    parser.add_argument("--discovery-devices", type=int, default=5)
+    parser.add_argument("--discovery-delay", type=float, default=0.2)
+    parser.add_argument("--connect-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    service = FakeBluez(
+        devices=args.devices,
+        signal_rate=args.signal_rate,
+        discovery_devices=args.discovery_devices,
+        discovery_delay=args.discovery_delay,
+        connect_delay=args.connect_delay,
+    )
+    service.start()
+    service.start_signals()
+    logger.info(f"Fake BlueZ running with {args.devices} devices")
+    print("READY", flush=True)
+    service.thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""Benchmarks for mopidy-bluetooth-manager against the fake BlueZ service.
+
+Starts a private dbus-daemon, runs benchmarks/fake_bluez.py on it and points
+the extension's system bus at it, then measures:
+
+    rpc        bluetooth.* JSON-RPC latency percentiles
+    signals    on_properties_changed throughput, until the event queue drained
+    discovery  time from bluetooth.adapter.discover to the first device
+    memory     heap growth while handling signals and RPCs for a while
+
+    python benchmarks/run.py --devices 200 --save results.json
+    python benchmarks/run.py --baseline results.json --tolerance 0.25
+    python benchmarks/run.py --backend dbus-fast --baseline results.json
+
+With --baseline the run fails when a metric regressed by more than the
+tolerance, so it can gate changes in CI. --backend picks the D-Bus backend
+under test, both are expected to pass against the same baseline.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+root = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(root.parent / "src"))
+
+# Lower is better for all metrics except these
+higher_is_better = {"signals_per_second"}
+
+rpc_methods = (
+    ("bluetooth.devices", {}),
+    ("bluetooth.devices.info", None),
+    ("bluetooth.devices.connections", {}),
+    ("bluetooth.player", {}),
+)
+
+
+class RecordingController():
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls += 1
+        return call
+
+
+class RecordingCore():
+    """Stands in for the Mopidy core actor proxy, counting calls"""
+
+    def __init__(self):
+        self.playback = RecordingController()
+        self.mixer = RecordingController()
+
+
+def ext_config(args):
+    return {
+        "core": {"data_dir": args.data_dir},
+        "bluetooth-manager": {
+            "enabled": True,
+            "name": "mopidybluez",
+            "pincode": "1111",
+            "agent": False,
+            "agent_capability": "NoInputNoOutput",
+            "pairing_allow": [],
+            "pairing_deny": [],
+            "autoconnect": False,
+            "initial-volume": 10,
+            "volume_write_rate": 10,
+            "attach_audio_sink": False,
+            "audio_sink_latency": 20,
+            "audio_sink_buffer": 60,
+            "adapters": [],
+            "discovery_transport": "bredr",
+            "discovery_uuids": ["0000110a-0000-1000-8000-00805f9b34fb"],
+            "discovery_rssi": -90,
+            "backend": args.backend,
+            "rpc_workers": 4,
+            "rpc_max_pending": 32,
+            "rpc_timeout": 5,
+            "event_queue_size": 256,
+            "prune_interval": None,
+            "prune_max_devices": None,
+            "prune_max_age": None,
+            "prune_keep_trusted": False,
+        },
+    }
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    def at(fraction):
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+    return {
+        "p50": at(0.50) * 1000,
+        "p95": at(0.95) * 1000,
+        "p99": at(0.99) * 1000,
+        "max": samples[-1] * 1000,
+        "mean": statistics.fmean(samples) * 1000,
+    }
+
+
+class PrivateBus():
+    """dbus-daemon on a temporary socket with the fake BlueZ service on it"""
+
+    def __init__(self, args):
+        self.args = args
+        self.daemon = None
+        self.service = None
+
+    def __enter__(self):
+        self.daemon = subprocess.Popen(
+            ["dbus-daemon", "--session", "--nofork", "--print-address=1"],
+            stdout=subprocess.PIPE, text=True,
+        )
+        address = self.daemon.stdout.readline().strip()
+        # Read by GDBus, so the extension's pydbus.SystemBus() ends up here
+        os.environ["DBUS_SYSTEM_BUS_ADDRESS"] = address
+        self.service = subprocess.Popen(
+            [
+                sys.executable, str(root / "fake_bluez.py"),
+                "--devices", str(self.args.devices),
+                "--signal-rate", str(self.args.signal_rate),
+                "--discovery-devices", str(self.args.discovery_devices),
+                "--discovery-delay", str(self.args.discovery_delay),
+            ],
+            stdout=subprocess.PIPE, text=True,
+        )
+        if self.service.stdout.readline().strip() != "READY":
+            raise RuntimeError("Fake BlueZ service failed to start")
+        return self
+
+    def __exit__(self, *exc):
+        for process in (self.service, self.daemon):
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=5)
+
+
+def bench_rpc(controller, jsonrpc, args):
+    device_path = controller.get_devices()[0]["device_path"]
+    results = {}
+    request_id = 0
+    for method, params in rpc_methods:
+        if params is None:
+            params = {"device_path": device_path}
+        samples = []
+        for _ in range(args.iterations):
+            request_id += 1
+            request = json.dumps({
+                "jsonrpc": "2.0", "id": request_id, "method": method, "params": params,
+            })
+            started = time.perf_counter()
+            response = json.loads(jsonrpc.handle_json(request))
+            samples.append(time.perf_counter() - started)
+            if "error" in response:
+                raise RuntimeError(f"{method} failed: {response['error']}")
+        results[method] = percentiles(samples)
+    return results
+
+
+def synthetic_signals(controller, count):
+    """PropertiesChanged payloads in the mix the fake service emits"""
+    tree = controller.object_tree
+    player_path, _ = tree.player_for(controller.get_device()["device_path"])
+    transport_path, _ = tree.transport_for(controller.get_device()["device_path"])
+    devices = [path for path, _ in tree.devices()]
+    signals = []
+    for i in range(count):
+        kind = i % 10
+        if kind < 4:
+            signals.append((player_path, ("org.bluez.MediaPlayer1", {"Position": i * 1000}, [])))
+        elif kind < 5:
+            track = {"Title": f"Track {i}", "Artist": "Artist", "Album": "Album",
+                     "TrackNumber": i, "Duration": 180000}
+            signals.append((player_path, ("org.bluez.MediaPlayer1", {"Track": track}, [])))
+        elif kind < 7:
+            signals.append((transport_path, ("org.bluez.MediaTransport1", {"Volume": i % 128}, [])))
+        else:
+            path = devices[i % len(devices)]
+            signals.append((path, ("org.bluez.Device1", {"RSSI": -40 - i % 50}, [])))
+    return signals
+
+
+def handle_signals(controller, signals):
+    """Feeds signals in and waits until their handlers ran"""
+    for path, params in signals:
+        controller.on_properties_changed(
+            "org.bluez", path, "org.freedesktop.DBus.Properties", "PropertiesChanged", params
+        )
+    if not controller.events.wait_idle(timeout=60):
+        raise RuntimeError("Bluetooth event queue did not drain")
+
+
+def bench_signals(controller, args):
+    from mopidy_bluetooth_manager.dispatch import events_coalesced, events_dropped
+
+    signals = synthetic_signals(controller, args.signals)
+    coalesced = events_coalesced.value()
+    dropped = events_dropped.value()
+    started = time.perf_counter()
+    handle_signals(controller, signals)
+    elapsed = time.perf_counter() - started
+    return {
+        "signals": len(signals),
+        "seconds": elapsed,
+        "signals_per_second": len(signals) / elapsed,
+        # Handlers skipped because a newer value replaced them, or the queue was full
+        "coalesced": events_coalesced.value() - coalesced,
+        "dropped": events_dropped.value() - dropped,
+    }
+
+
+def bench_discovery(controller, args):
+    samples = []
+    for _ in range(args.discovery_runs):
+        started = time.perf_counter()
+        session = controller.discover_devices(count=1, timeout=args.discovery_timeout)
+        while not session["devices"] and not session["done"]:
+            time.sleep(0.005)
+            session = controller.discover_poll(session["session_id"])
+        if not session["devices"]:
+            raise RuntimeError("Discovery did not find any device")
+        samples.append(time.perf_counter() - started)
+        session = controller.discover_stop(session["session_id"])
+        # Forget the found devices, otherwise the next run reports them at once
+        for device in session["devices"]:
+            controller.device_remove(device["device_path"])
+        while any(controller.object_tree.get(device["device_path"], "org.bluez.Device1")
+                  for device in session["devices"]):
+            time.sleep(0.005)
+    return percentiles(samples)
+
+
+def bench_memory(controller, jsonrpc, args):
+    signals = synthetic_signals(controller, 1000)
+    request = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "bluetooth.player", "params": {}})
+
+    def work():
+        handle_signals(controller, signals)
+        jsonrpc.handle_json(request)
+
+    tracemalloc.start()
+    work()  # warm up caches before taking the baseline
+    baseline, _ = tracemalloc.get_traced_memory()
+    samples = []
+    deadline = time.monotonic() + args.memory_seconds
+    while time.monotonic() < deadline:
+        work()
+        samples.append(tracemalloc.get_traced_memory()[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "baseline_kib": baseline / 1024,
+        "final_kib": samples[-1] / 1024,
+        "peak_kib": peak / 1024,
+        "growth_kib": (samples[-1] - baseline) / 1024,
+    }
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def regressions(results, baseline, tolerance):
+    current = flatten(results)
+    failed = []
+    for name, before in flatten(baseline).items():
+        after = current.get(name)
+        if after is None or not before or name.endswith((".signals", ".seconds", ".coalesced", ".dropped")):
+            continue
+        change = (after - before) / abs(before)
+        if name.rsplit(".", 1)[-1] in higher_is_better:
+            change = -change
+        if change > tolerance:
+            failed.append(f"{name}: {before:.3f} -> {after:.3f} ({change:+.0%})")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmarks", nargs="*", default=["rpc", "signals", "discovery", "memory"])
+    parser.add_argument("--backend", choices=["pydbus", "dbus-fast"], default="pydbus")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--signal-rate", type=float, default=0,
+                        help="background PropertiesChanged per second from the fake service")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--signals", type=int, default=20000)
+    parser.add_argument("--discovery-runs", type=int, default=5)
+    parser.add_argument("--discovery-devices", type=int, default=1)
+    parser.add_argument("--discovery-delay", type=float, default=0.2)
+    parser.add_argument("--discovery-timeout", type=float, default=10)
+    parser.add_argument("--memory-seconds", type=float, default=30)
+    parser.add_argument("--save", type=pathlib.Path)
+    parser.add_argument("--baseline", type=pathlib.Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    args.data_dir = tempfile.mkdtemp(prefix="bluetooth-bench-")
+
+    with PrivateBus(args):
+        from mopidy_bluetooth_manager.bluez_dbus import BluetoothDbusController
+        from mopidy_bluetooth_manager.frontend import make_jsonrpc_wrapper
+
+        controller = BluetoothDbusController(RecordingCore(), ext_config(args))
+        controller.start().result(timeout=30)
+        jsonrpc = make_jsonrpc_wrapper(controller)
+
+        results = {}
+        if "rpc" in args.benchmarks:
+            results["rpc"] = bench_rpc(controller, jsonrpc, args)
+        if "signals" in args.benchmarks:
+            results["signals"] = bench_signals(controller, args)
+        if "discovery" in args.benchmarks:
+            results["discovery"] = bench_discovery(controller, args)
+        if "memory" in args.benchmarks:
+            results["memory"] = bench_memory(controller, jsonrpc, args)
+        controller.stop()
+
+    print(json.dumps(results, indent=2))
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        failed = regressions(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for line in failed:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
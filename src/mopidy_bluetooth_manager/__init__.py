@@ -6,7 +6,6 @@ from mopidy.core.actor import CoreProxy
 from mopidy.http.types import HttpConfig
 
 from typing import TYPE_CHECKING, Any, cast
-from .frontend import JsonRpcHandler
 
 logger = logging.getLogger(__name__)
 
@@ -24,9 +23,31 @@ class Extension(ext.Extension):
 
         schema["name"] = config.String()
         schema["pincode"] = config.String()
+        schema["agent"] = config.Boolean()
+        schema["agent_capability"] = config.String(
+            choices=["NoInputNoOutput", "DisplayOnly", "DisplayYesNo", "KeyboardOnly", "KeyboardDisplay"]
+        )
+        schema["pairing_allow"] = config.List(optional=True)
+        schema["pairing_deny"] = config.List(optional=True)
         schema["autoconnect"] = config.Boolean()
-        schema["initial-volume"] = config.String()
-        schema["attach_audio_sink"] = config.String()
+        schema["initial-volume"] = config.Integer(optional=True, minimum=0, maximum=100)
+        schema["volume_write_rate"] = config.Integer(minimum=1)
+        schema["attach_audio_sink"] = config.Boolean()
+        schema["audio_sink_latency"] = config.Integer(minimum=5)
+        schema["audio_sink_buffer"] = config.Integer(minimum=0)
+        schema["adapters"] = config.List(optional=True)
+        schema["discovery_transport"] = config.String(choices=["auto", "bredr", "le"])
+        schema["discovery_uuids"] = config.List(optional=True)
+        schema["discovery_rssi"] = config.Integer(optional=True, minimum=-127, maximum=20)
+        schema["backend"] = config.String(choices=["pydbus", "dbus-fast"])
+        schema["rpc_workers"] = config.Integer(minimum=1)
+        schema["rpc_max_pending"] = config.Integer(minimum=1)
+        schema["rpc_timeout"] = config.Integer(minimum=1)
+        schema["event_queue_size"] = config.Integer(minimum=1)
+        schema["prune_interval"] = config.Integer(optional=True, minimum=1)
+        schema["prune_max_devices"] = config.Integer(optional=True, minimum=0)
+        schema["prune_max_age"] = config.Integer(optional=True, minimum=1)
+        schema["prune_keep_trusted"] = config.Boolean()
         return schema
 
 
@@ -39,7 +60,19 @@ class Extension(ext.Extension):
         
 
 def extension_factory(config, core):
+    from .frontend import JsonRpcHandler, get_controller, make_jsonrpc_wrapper
+    from .metrics import MetricsHandler, registry, rpc_queue_pending
+    from .push import DeltaBroadcaster, PushHandler
+
     http_config = cast(HttpConfig, config["http"])
+    controller = get_controller(core, config)
+    jsonrpc = make_jsonrpc_wrapper(controller)
+    broadcaster = DeltaBroadcaster(controller.object_tree)
+    controller.pruner.add_listener(
+        lambda job: broadcaster.publish("prune", job["job_id"], "changed", job)
+    )
+    workers = controller.workers
+    rpc_queue_pending.set_function(lambda: workers.pending)
     return [
         (
             r"/rpc/?", 
@@ -47,10 +80,26 @@ def extension_factory(config, core):
             {
                 "core": core, 
                 "config": config,
+                "jsonrpc": jsonrpc,
+                "workers": workers,
+                "allowed_origins": http_config["allowed_origins"],
+                "csrf_protection": http_config["csrf_protection"],
+            }
+        ),
+        (
+            r"/ws/?",
+            PushHandler,
+            {
+                "broadcaster": broadcaster,
                 "allowed_origins": http_config["allowed_origins"],
                 "csrf_protection": http_config["csrf_protection"],
             }
         ),
+        (
+            r"/metrics/?",
+            MetricsHandler,
+            {"registry": registry},
+        ),
     ]
 
 
@@ -0,0 +1,236 @@
+import logging
+import math
+import threading
+
+from .bluez_objects import TRANSPORT_IFACE
+
+logger = logging.getLogger(__name__)
+
+CODEC_SBC = 0x00
+CODEC_MPEG12 = 0x01
+CODEC_AAC = 0x02
+CODEC_VENDOR = 0xFF
+
+
+def _bit_table(mapping, size=256):
+    """Precomputes value lookups for every possible field value.
+
+    mapping is ordered by priority, the first flag set in a value wins, the
+    same way a capability bitmask is read after configuration.
+    """
+    return tuple(
+        next((value for flag, value in mapping.items() if bits & flag), None)
+        for bits in range(size)
+    )
+
+
+channel_counts = {
+    "Mono": 1,
+    "Dual Channel": 2,
+    "Stereo": 2,
+    "Joint Stereo": 2,
+}
+
+sbc_rates = _bit_table({0x80: 16000, 0x40: 32000, 0x20: 44100, 0x10: 48000})
+sbc_channel_modes = _bit_table(
+    {0x08: "Mono", 0x04: "Dual Channel", 0x02: "Stereo", 0x01: "Joint Stereo"}
+)
+sbc_block_lengths = _bit_table({0x80: 4, 0x40: 8, 0x20: 12, 0x10: 16})
+sbc_subbands = _bit_table({0x08: 4, 0x04: 8})
+sbc_allocations = _bit_table({0x02: "SNR", 0x01: "Loudness"})
+
+mpeg_layers = _bit_table({0x80: "Layer I", 0x40: "Layer II", 0x20: "Layer III"})
+mpeg_channel_modes = sbc_channel_modes
+mpeg_rates = _bit_table(
+    {0x20: 16000, 0x10: 22050, 0x08: 24000, 0x04: 32000, 0x02: 44100, 0x01: 48000}
+)
+
+aac_object_types = _bit_table({
+    0x80: "MPEG-2 AAC LC",
+    0x40: "MPEG-4 AAC LC",
+    0x20: "MPEG-4 AAC LTP",
+    0x10: "MPEG-4 AAC Scalable",
+    0x08: "MPEG-4 HE-AAC",
+    0x04: "MPEG-4 HE-AACv2",
+    0x02: "MPEG-4 AAC-ELDv2",
+})
+aac_rates = _bit_table({
+    0x800: 8000, 0x400: 11025, 0x200: 12000, 0x100: 16000,
+    0x080: 22050, 0x040: 24000, 0x020: 32000, 0x010: 44100,
+    0x008: 48000, 0x004: 64000, 0x002: 88200, 0x001: 96000,
+}, size=4096)
+aac_channels = _bit_table({0x08: 1, 0x04: 2, 0x02: 6, 0x01: 8}, size=16)
+
+aptx_rates = _bit_table({0x80: 16000, 0x40: 32000, 0x20: 44100, 0x10: 48000})
+aptx_channel_modes = _bit_table({0x02: "Stereo", 0x01: "Mono"})
+
+ldac_rates = _bit_table(
+    {0x20: 44100, 0x10: 48000, 0x08: 88200, 0x04: 96000, 0x02: 176400, 0x01: 192000}
+)
+ldac_channel_modes = _bit_table({0x01: "Stereo", 0x02: "Dual Channel", 0x04: "Mono"})
+
+
+def _result(codec, rate=None, channel_mode=None, channels=None, **extra):
+    if channels is None:
+        channels = channel_counts.get(channel_mode)
+    return {
+        "codec": codec,
+        "rate": rate,
+        "channels": channels,
+        "channel_mode": channel_mode,
+        **extra,
+    }
+
+
+def sbc_frame_length(channel_mode, blocks, subbands, bitpool):
+    """Frame length in bytes as defined by the A2DP specification"""
+    channels = channel_counts[channel_mode]
+    length = 4 + (4 * subbands * channels) // 8
+    if channel_mode in ("Mono", "Dual Channel"):
+        return length + math.ceil(blocks * channels * bitpool / 8)
+    if channel_mode == "Stereo":
+        return length + math.ceil(blocks * bitpool / 8)
+    return length + math.ceil((subbands + blocks * bitpool) / 8)
+
+
+def decode_sbc(config):
+    rate = sbc_rates[config[0]]
+    channel_mode = sbc_channel_modes[config[0]]
+    blocks = sbc_block_lengths[config[1]]
+    subbands = sbc_subbands[config[1]]
+    min_bitpool, max_bitpool = config[2], config[3]
+
+    bitrate = None
+    frame_duration = None
+    if rate and channel_mode and blocks and subbands:
+        frame_samples = blocks * subbands
+        frame_length = sbc_frame_length(channel_mode, blocks, subbands, max_bitpool)
+        bitrate = 8 * frame_length * rate // frame_samples
+        frame_duration = 1000 * frame_samples / rate
+
+    return _result(
+        "SBC", rate, channel_mode,
+        block_length=blocks,
+        subbands=subbands,
+        allocation=sbc_allocations[config[1]],
+        min_bitpool=min_bitpool,
+        max_bitpool=max_bitpool,
+        bitrate=bitrate,
+        frame_duration_ms=frame_duration,
+    )
+
+
+def decode_mpeg12(config):
+    rate = mpeg_rates[config[1] & 0x3F]
+    return _result(
+        "MPEG", rate, mpeg_channel_modes[config[0]],
+        layer=mpeg_layers[config[0]],
+        crc=bool(config[0] & 0x10),
+        vbr=bool(config[2] & 0x80),
+        bitrate=None,
+        frame_duration_ms=1000 * 1152 / rate if rate else None,
+    )
+
+
+def decode_aac(config):
+    rate = aac_rates[(config[1] << 4) | (config[2] >> 4)]
+    object_type = aac_object_types[config[0]]
+    frame_samples = 2048 if object_type and "HE-AAC" in object_type else 1024
+    return _result(
+        "AAC", rate,
+        channels=aac_channels[config[2] & 0x0F],
+        object_type=object_type,
+        vbr=bool(config[3] & 0x80),
+        bitrate=((config[3] & 0x7F) << 16) | (config[4] << 8) | config[5] or None,
+        frame_duration_ms=1000 * frame_samples / rate if rate else None,
+    )
+
+
+def _decode_aptx(codec, bits_per_sample):
+    def decode(config):
+        rate = aptx_rates[config[6]]
+        channel_mode = aptx_channel_modes[config[6] & 0x0F]
+        channels = channel_counts.get(channel_mode)
+        return _result(
+            codec, rate, channel_mode,
+            bitrate=rate * channels * bits_per_sample if rate and channels else None,
+            frame_duration_ms=1000 * 4 / rate if rate else None,
+        )
+    return decode
+
+
+def decode_ldac(config):
+    return _result(
+        "LDAC", ldac_rates[config[6] & 0x3F], ldac_channel_modes[config[7] & 0x07],
+        bitrate=None,
+        frame_duration_ms=None,
+    )
+
+
+# (vendor id, vendor codec id) -> (name, decoder)
+vendor_codecs = {
+    (0x0000004F, 0x0001): ("aptX", _decode_aptx("aptX", 4)),
+    (0x000000D7, 0x0024): ("aptX HD", _decode_aptx("aptX HD", 6)),
+    (0x0000000A, 0x0002): ("aptX Low Latency", _decode_aptx("aptX Low Latency", 4)),
+    (0x000000D7, 0x00AD): ("aptX Adaptive", None),
+    (0x0000000A, 0x0001): ("FastStream", None),
+    (0x0000012D, 0x00AA): ("LDAC", decode_ldac),
+    (0x000008A9, 0x0001): ("LC3plus", None),
+}
+
+
+def decode_vendor(config):
+    if len(config) < 6:
+        raise ValueError("Vendor codec configuration too short")
+    vendor_id = int.from_bytes(config[0:4], "little")
+    codec_id = int.from_bytes(config[4:6], "little")
+    name, decoder = vendor_codecs.get(
+        (vendor_id, codec_id), (f"Vendor {vendor_id:#010x}:{codec_id:#06x}", None)
+    )
+    result = decoder(config) if decoder is not None else _result(name)
+    result["vendor_id"] = vendor_id
+    result["vendor_codec_id"] = codec_id
+    return result
+
+
+codec_decoders = {
+    CODEC_SBC: decode_sbc,
+    CODEC_MPEG12: decode_mpeg12,
+    CODEC_AAC: decode_aac,
+    CODEC_VENDOR: decode_vendor,
+}
+
+
+def decode_a2dp_config(codec, config):
+    """Decodes a MediaTransport1 Codec and Configuration pair"""
+    decoder = codec_decoders.get(codec)
+    if decoder is None:
+        return _result(f"Unknown ({codec})")
+    try:
+        return decoder(bytes(config))
+    except (IndexError, TypeError, ValueError):
+        logger.debug(f"Invalid A2DP configuration for codec {codec}: {config!r}")
+        return _result(f"Invalid ({codec})")
+
+
+class CodecConfigCache():
+    """Memoizes decoded A2DP configurations per MediaTransport1 path"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def decode(self, transport_path, codec, config):
+        key = (codec, bytes(config or b""))
+        with self._lock:
+            entry = self._entries.get(transport_path)
+        if entry is None or entry[0] != key:
+            entry = (key, decode_a2dp_config(*key))
+            with self._lock:
+                self._entries[transport_path] = entry
+        return dict(entry[1])
+
+    def on_object_event(self, event, path, interface, changed):
+        if interface == TRANSPORT_IFACE and event == "removed":
+            with self._lock:
+                self._entries.pop(path, None)
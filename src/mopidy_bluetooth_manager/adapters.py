@@ -0,0 +1,100 @@
+import collections
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .bluez_objects import ADAPTER_IFACE, DEVICE_IFACE
+
+logger = logging.getLogger(__name__)
+
+default_adapter_path = '/org/bluez/hci0'
+
+
+def adapter_name(path):
+    return path.rsplit("/", 1)[-1]
+
+
+class AdapterRegistry():
+    """Bluetooth controllers available to the extension.
+
+    Built from the Adapter1 objects in the object tree. The adapters config
+    value narrows the set down and gives each controller its own alias, each
+    entry is either `hciN` or `hciN:alias`.
+    """
+
+    def __init__(self, object_tree, max_workers=4):
+        self.object_tree = object_tree
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="BluetoothAdapter")
+        self.enabled = None
+        self.aliases = {}
+        self.default_alias = None
+
+    def configure(self, ext_config):
+        self.default_alias = ext_config["name"]
+        entries = ext_config.get("adapters") or []
+        self.enabled = set() if entries else None
+        self.aliases = {}
+        for entry in entries:
+            name, _, alias = entry.partition(":")
+            self.enabled.add(name.strip())
+            if alias.strip():
+                self.aliases[name.strip()] = alias.strip()
+
+    def paths(self):
+        return sorted(
+            path for path, _ in self.object_tree.find(ADAPTER_IFACE)
+            if self.enabled is None or adapter_name(path) in self.enabled
+        )
+
+    def default(self):
+        paths = self.paths()
+        return paths[0] if paths else default_adapter_path
+
+    def alias_for(self, path, name=None):
+        return self.aliases.get(adapter_name(path), name or self.default_alias)
+
+    def adapter_of(self, device_path):
+        device = self.object_tree.get(device_path, DEVICE_IFACE) or {}
+        return device.get("Adapter") or device_path.rsplit("/", 1)[0]
+
+    def loads(self):
+        """Returns the number of connected devices per adapter"""
+        loads = collections.Counter({path: 0 for path in self.paths()})
+        for path, device in self.object_tree.connected_devices():
+            loads[device.get("Adapter") or self.adapter_of(path)] += 1
+        return loads
+
+    def least_loaded(self, device_paths):
+        """Picks the device path that sits on the adapter with the fewest connections"""
+        loads = self.loads()
+        return min(
+            device_paths,
+            key=lambda path: loads.get(self.adapter_of(path), 0),
+            default=None,
+        )
+
+    def stop(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def run_all(self, fn):
+        """Calls fn(adapter_path) on every adapter concurrently.
+
+        Returns {adapter_path: result}. Failing adapters are logged and
+        left out, the error is raised only when every adapter failed.
+        """
+        paths = self.paths() or [default_adapter_path]
+        if len(paths) == 1:
+            return {paths[0]: fn(paths[0])}
+
+        results = {}
+        errors = []
+        futures = {path: self._executor.submit(fn, path) for path in paths}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                logger.warning(f"Bluetooth adapter {path} failed: {e}")
+                errors.append(e)
+        if errors and not results:
+            raise errors[0]
+        return results
@@ -0,0 +1,148 @@
+import fnmatch
+import logging
+
+from gi.repository import GLib
+
+from .bluez_objects import DEVICE_IFACE
+
+logger = logging.getLogger(__name__)
+
+agent_path = "/mopidy/bluetooth/agent"
+
+
+class Rejected(Exception):
+    pass
+
+
+# pydbus returns the exception class name as the D-Bus error name
+Rejected.__name__ = "org.bluez.Error.Rejected"
+
+
+class PairingAgent():
+    """
+    <node>
+        <interface name="org.bluez.Agent1">
+            <method name="Release"/>
+            <method name="RequestPinCode">
+                <arg name="device" type="o" direction="in"/>
+                <arg name="pincode" type="s" direction="out"/>
+            </method>
+            <method name="DisplayPinCode">
+                <arg name="device" type="o" direction="in"/>
+                <arg name="pincode" type="s" direction="in"/>
+            </method>
+            <method name="RequestPasskey">
+                <arg name="device" type="o" direction="in"/>
+                <arg name="passkey" type="u" direction="out"/>
+            </method>
+            <method name="DisplayPasskey">
+                <arg name="device" type="o" direction="in"/>
+                <arg name="passkey" type="u" direction="in"/>
+                <arg name="entered" type="q" direction="in"/>
+            </method>
+            <method name="RequestConfirmation">
+                <arg name="device" type="o" direction="in"/>
+                <arg name="passkey" type="u" direction="in"/>
+            </method>
+            <method name="RequestAuthorization">
+                <arg name="device" type="o" direction="in"/>
+            </method>
+            <method name="AuthorizeService">
+                <arg name="device" type="o" direction="in"/>
+                <arg name="uuid" type="s" direction="in"/>
+            </method>
+            <method name="Cancel"/>
+        </interface>
+    </node>
+    """
+
+    def __init__(
+            self, object_tree, backend, pincode, allow=None, deny=None,
+            capability="NoInputNoOutput", defer=GLib.idle_add):
+        self.object_tree = object_tree
+        self.defer = defer
+        self.backend = backend
+        self.pincode = str(pincode or "0000")
+        self.allow = [pattern.upper() for pattern in allow or []]
+        self.deny = [pattern.upper() for pattern in deny or []]
+        self.capability = capability
+        self._registration = None
+
+    def publish(self, bus):
+        """Exports the agent object on our side of the bus"""
+        if self._registration is None:
+            self._registration = bus.register_object(agent_path, self, None)
+
+    def register(self, bus, service):
+        """Makes the agent BlueZ's default, needed again after bluetoothd restarts"""
+        manager = bus.get(service, "/org/bluez")
+        try:
+            manager.UnregisterAgent(agent_path)
+        except Exception:
+            pass
+        manager.RegisterAgent(agent_path, self.capability)
+        manager.RequestDefaultAgent(agent_path)
+        logger.info(f"Bluetooth pairing agent registered ({self.capability})")
+
+    def allowed(self, device):
+        """Checks a device address against the deny list first, then the allow list.
+
+        Names and aliases are chosen by the remote device, so they are never
+        matched.
+        """
+        props = self.object_tree.get(device, DEVICE_IFACE) or {}
+        address = str(props.get("Address") or "").upper()
+        if not address:
+            return False
+        if any(fnmatch.fnmatchcase(address, pattern) for pattern in self.deny):
+            return False
+        if not self.allow:
+            return True
+        return any(fnmatch.fnmatchcase(address, pattern) for pattern in self.allow)
+
+    def authorize(self, device):
+        if not self.allowed(device):
+            logger.info(f"Rejected Bluetooth pairing with {device}")
+            raise Rejected(f"Pairing with {device} not allowed")
+        # Trust once the reply is on its way, so bluetoothd is not waiting on us
+        self.defer(self._trust, device)
+
+    def Release(self):
+        logger.info("Bluetooth pairing agent released")
+
+    def RequestPinCode(self, device):
+        self.authorize(device)
+        return self.pincode
+
+    def DisplayPinCode(self, device, pincode):
+        self.authorize(device)
+
+    def RequestPasskey(self, device):
+        self.authorize(device)
+        try:
+            return int(self.pincode) % 1000000
+        except ValueError:
+            raise Rejected("Configured pincode is not numeric") from None
+
+    def DisplayPasskey(self, device, passkey, entered):
+        pass
+
+    def RequestConfirmation(self, device, passkey):
+        self.authorize(device)
+
+    def RequestAuthorization(self, device):
+        self.authorize(device)
+
+    def AuthorizeService(self, device, uuid):
+        if not self.allowed(device):
+            raise Rejected(f"Service {uuid} not authorized for {device}")
+
+    def Cancel(self):
+        logger.info("Bluetooth pairing cancelled")
+
+    def _trust(self, device):
+        try:
+            self.backend.set_property(device, DEVICE_IFACE, "Trusted", True)
+        except Exception as e:
+            logger.warning(f"Failed to trust Bluetooth device {device}: {e}")
+        return False
@@ -0,0 +1,176 @@
+import logging
+import threading
+
+from mopidy.internal.gi import Gst
+
+from .bluez_objects import DEVICE_IFACE, TRANSPORT_IFACE
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+audio_latency = registry.gauge(
+    "bluetooth_audio_latency_seconds", "Latency reported by the Bluetooth capture pipeline"
+)
+audio_xruns = registry.counter(
+    "bluetooth_audio_xruns_total", "Audio dropped by the Bluetooth capture pipeline's source or sink"
+)
+
+
+def gst_format(alsa_format):
+    """Converts an ALSA sample format name, e.g. S24_3LE, to its GStreamer name"""
+    if not alsa_format:
+        return "S16LE"
+    name = alsa_format.upper()
+    if "_3" in name:
+        return name.replace("_3", "")
+    if name.startswith(("S24_", "U24_")):
+        return name.replace("_", "_32")
+    return name.replace("_", "")
+
+
+def pipeline_description(address, output, fmt, rate, channels, latency_ms, buffer_ms):
+    caps = f"audio/x-raw,format={fmt},layout=interleaved"
+    if rate:
+        caps += f",rate={rate}"
+    if channels:
+        caps += f",channels={channels}"
+    # alsasrc periods sized from the target latency. The queue is the jitter
+    # buffer: it holds back until buffer_ms of audio is queued, and past
+    # twice that it drops the oldest audio instead of adding delay
+    max_ms = 2 * max(buffer_ms, latency_ms)
+    return (
+        f'alsasrc name=source device="bluealsa:DEV={address},PROFILE=a2dp" '
+        f"latency-time={latency_ms * 1000} buffer-time={latency_ms * 2000} "
+        f"! {caps} "
+        f"! queue name=jitter min-threshold-time={buffer_ms * 1000000} "
+        f"max-size-time={max_ms * 1000000} "
+        f"max-size-buffers=0 max-size-bytes=0 leaky=downstream "
+        f"! audioconvert ! audioresample ! {output}"
+    )
+
+
+class BluetoothAudioSink():
+    """Plays the connected A2DP stream through Mopidy's audio output.
+
+    A GStreamer pipeline captures the BlueALSA PCM of the active transport
+    in the sample format, rate and channel count it was negotiated with, so
+    nothing is resampled unless the output itself requires it. Volume is
+    left to the transport, which VolumeSync keeps in step with the mixer.
+    """
+
+    def __init__(self, object_tree, describe, output, latency_ms=20, buffer_ms=60):
+        self.object_tree = object_tree
+        self.describe = describe
+        self.output = output
+        self.latency_ms = latency_ms
+        self.buffer_ms = buffer_ms
+        self._lock = threading.Lock()
+        self._pipeline = None
+        self._transport_path = None
+        self._xruns = 0
+
+    def on_object_event(self, event, path, interface, changed):
+        if interface != TRANSPORT_IFACE:
+            return
+        if event == "removed":
+            if path == self._transport_path:
+                self.stop()
+        elif changed.get("State") == "active":
+            self.start(path)
+        elif changed.get("State") == "idle" and path == self._transport_path:
+            self.stop()
+
+    def attach_active(self):
+        """Starts on a transport that was already streaming when the tree was seeded"""
+        for path, transport in self.object_tree.find(TRANSPORT_IFACE):
+            if transport.get("State") == "active":
+                self.start(path)
+                return
+
+    def start(self, transport_path):
+        with self._lock:
+            if self._transport_path == transport_path and self._pipeline is not None:
+                return
+        transport = self.object_tree.get(transport_path, TRANSPORT_IFACE) or {}
+        device_path = transport.get("Device")
+        device = self.object_tree.get(device_path, DEVICE_IFACE) or {}
+        address = device.get("Address")
+        if not address:
+            logger.warning(f"No device address for {transport_path}, not attaching audio")
+            return
+
+        stream = self.describe(transport_path, device_path)
+        description = pipeline_description(
+            address, self.output, gst_format(stream.get("format")),
+            stream.get("rate"), stream.get("channels"), self.latency_ms, self.buffer_ms,
+        )
+        self.stop()
+
+        logger.info(f"Attaching Bluetooth audio from {address}: {description}")
+        try:
+            pipeline = Gst.parse_launch(description)
+        except Exception as e:
+            logger.error(f"Failed to build Bluetooth audio pipeline: {e}")
+            return
+        bus = pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", self._on_message)
+
+        with self._lock:
+            self._pipeline = pipeline
+            self._transport_path = transport_path
+        pipeline.set_state(Gst.State.PLAYING)
+
+    def stop(self):
+        with self._lock:
+            pipeline, self._pipeline = self._pipeline, None
+            self._transport_path = None
+        if pipeline is None:
+            return
+        pipeline.set_state(Gst.State.NULL)
+        pipeline.get_bus().remove_signal_watch()
+        audio_latency.set(0)
+        logger.info("Detached Bluetooth audio")
+
+    def stats(self):
+        with self._lock:
+            pipeline = self._pipeline
+            transport_path = self._transport_path
+        return {
+            "attached": pipeline is not None,
+            "transport_path": transport_path,
+            "latency_ms": self._query_latency(pipeline) * 1000 if pipeline else None,
+            "target_latency_ms": self.latency_ms,
+            "buffer_ms": self.buffer_ms,
+            "xruns": self._xruns,
+        }
+
+    def _query_latency(self, pipeline):
+        query = Gst.Query.new_latency()
+        if not pipeline.query(query):
+            return 0.0
+        _live, min_latency, _max_latency = query.parse_latency()
+        # The jitter buffer adds its fill level on top of the element latency
+        jitter = pipeline.get_by_name("jitter").get_property("current-level-time")
+        latency = (min_latency + jitter) / Gst.SECOND
+        audio_latency.set(latency)
+        return latency
+
+    def _on_message(self, _bus, message):
+        if message.type == Gst.MessageType.ERROR:
+            error, debug = message.parse_error()
+            logger.error(f"Bluetooth audio pipeline error: {error.message} ({debug})")
+            self.stop()
+        elif message.type == Gst.MessageType.QOS:
+            # alsasrc posts QoS when it had to skip samples, the audio sink
+            # when it dropped late ones, both are audible dropouts
+            _format, _processed, dropped = message.parse_qos_stats()
+            if dropped:
+                self._xruns += 1
+                audio_xruns.inc()
+        elif message.type == Gst.MessageType.LATENCY:
+            with self._lock:
+                pipeline = self._pipeline
+            if pipeline is not None:
+                pipeline.recalculate_latency()
+                self._query_latency(pipeline)
@@ -0,0 +1,161 @@
+import abc
+
+from gi.repository import GLib
+
+from .bluez_objects import ADAPTER_IFACE, DEVICE_IFACE, PLAYER_IFACE, TRANSPORT_IFACE
+from .proxies import ProxyCache
+
+bluez_service = "org.bluez"
+
+PROPERTIES_IFACE = "org.freedesktop.DBus.Properties"
+OBJECT_MANAGER_IFACE = "org.freedesktop.DBus.ObjectManager"
+
+backend_names = ("pydbus", "dbus-fast")
+
+# Types of everything the extension writes to BlueZ, so values can be
+# marshalled without introspecting the remote object first
+property_signatures = {
+    (ADAPTER_IFACE, "Powered"): "b",
+    (ADAPTER_IFACE, "Alias"): "s",
+    (ADAPTER_IFACE, "Discoverable"): "b",
+    (ADAPTER_IFACE, "Pairable"): "b",
+    (DEVICE_IFACE, "Trusted"): "b",
+    (TRANSPORT_IFACE, "Volume"): "q",
+}
+
+discovery_filter_signatures = {
+    "Transport": "s",
+    "UUIDs": "as",
+    "RSSI": "n",
+    "Pathloss": "q",
+    "DuplicateData": "b",
+    "Discoverable": "b",
+    "Pattern": "s",
+}
+
+player_commands = ("Play", "Pause", "Stop", "Next", "Previous")
+
+
+class BluezBackend(abc.ABC):
+    """The D-Bus operations the controller performs on BlueZ.
+
+    Subclasses provide call, variant and subscribe, everything else is
+    built on those from the static signatures above. Calls block the
+    calling thread and return plain Python values, signal callbacks get
+    pydbus style (sender, path, interface, signal, params) arguments.
+    """
+
+    name = None
+
+    def __init__(self, service=bluez_service):
+        self.service = service
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def reset(self):
+        """Drops per-object state after the service owner changed"""
+
+    def on_object_event(self, event, path, interface, changed):
+        pass
+
+    @abc.abstractmethod
+    def call(self, path, interface, method, signature="", args=(), timeout=None):
+        """Calls method and returns its unpacked reply, raising D-Bus errors"""
+
+    @abc.abstractmethod
+    def variant(self, signature, value):
+        """Wraps value for a v argument"""
+
+    @abc.abstractmethod
+    def subscribe(self, sender, interface, signal, callback, arg0=None):
+        """Calls callback(sender, path, interface, signal, params) for matching signals"""
+
+    def get_managed_objects(self):
+        return self.call("/", OBJECT_MANAGER_IFACE, "GetManagedObjects")
+
+    def set_property(self, path, interface, name, value):
+        signature = property_signatures[(interface, name)]
+        self.call(
+            path, PROPERTIES_IFACE, "Set", "ssv",
+            (interface, name, self.variant(signature, value)),
+        )
+
+    def start_discovery(self, adapter):
+        self.call(adapter, ADAPTER_IFACE, "StartDiscovery")
+
+    def stop_discovery(self, adapter):
+        self.call(adapter, ADAPTER_IFACE, "StopDiscovery")
+
+    def set_discovery_filter(self, adapter, scan_filter):
+        arguments = {
+            key: self.variant(discovery_filter_signatures[key], value)
+            for key, value in scan_filter.items()
+        }
+        self.call(adapter, ADAPTER_IFACE, "SetDiscoveryFilter", "a{sv}", (arguments,))
+
+    def remove_device(self, adapter, device):
+        self.call(adapter, ADAPTER_IFACE, "RemoveDevice", "o", (device,))
+
+    def connect(self, device, timeout=None):
+        self.call(device, DEVICE_IFACE, "Connect", timeout=timeout)
+
+    def disconnect(self, device, timeout=None):
+        self.call(device, DEVICE_IFACE, "Disconnect", timeout=timeout)
+
+    def player_command(self, player, command):
+        if command not in player_commands:
+            raise ValueError(f"Unknown player command {command}")
+        self.call(player, PLAYER_IFACE, command)
+
+
+class PydbusBackend(BluezBackend):
+    """Calls through cached pydbus proxies.
+
+    pydbus introspects an object before it can call it, ProxyCache keeps
+    the generated proxies until the object changes shape. Signals are
+    dispatched on the main context that was the thread default when they
+    were subscribed.
+    """
+
+    name = "pydbus"
+
+    def __init__(self, get_bus, service=bluez_service):
+        super().__init__(service)
+        self.get_bus = get_bus
+        self.proxies = ProxyCache(get_bus, service)
+
+    def reset(self):
+        self.proxies.clear()
+
+    def on_object_event(self, event, path, interface, changed):
+        self.proxies.on_object_event(event, path, interface, changed)
+
+    def call(self, path, interface, method, signature="", args=(), timeout=None):
+        # The merged proxy would pick any interface with the method, e.g.
+        # Network1.Connect on devices that also export it
+        proxy = self.proxies.get(path)[interface]
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        return getattr(proxy, method)(*args, **kwargs)
+
+    def variant(self, signature, value):
+        return GLib.Variant(signature, value)
+
+    def subscribe(self, sender, interface, signal, callback, arg0=None):
+        return self.get_bus().subscribe(
+            sender=sender, iface=interface, signal=signal, arg0=arg0, signal_fired=callback
+        )
+
+
+def make_backend(name, get_bus, deliver=None, service=bluez_service):
+    """Creates the backend selected by the backend config value"""
+    if name == "dbus-fast":
+        try:
+            from .fast_backend import DbusFastBackend
+        except ImportError as e:
+            raise RuntimeError("backend = dbus-fast needs the dbus-fast package installed") from e
+        return DbusFastBackend(service, deliver=deliver)
+    return PydbusBackend(get_bus, service)
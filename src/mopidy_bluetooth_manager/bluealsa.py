@@ -0,0 +1,152 @@
+import logging
+import re
+import subprocess
+import threading
+
+logger = logging.getLogger(__name__)
+
+bluealsa_service = "org.bluealsa"
+bluealsa_path = "/org/bluealsa"
+PCM_IFACE = "org.bluealsa.PCM1"
+
+
+def pcm_format_name(value):
+    """Converts a BlueALSA PCM Format value into its ALSA name, e.g. S16_LE"""
+    sign = "S" if value & 0x8000 else "U"
+    endian = "BE" if value & 0x4000 else "LE"
+    size = (value >> 8) & 0x3F
+    width = value & 0xFF
+    if width == 8:
+        return f"{sign}8"
+    if size == 3:
+        return f"{sign}{width}_3{endian}"
+    return f"{sign}{width}_{endian}"
+
+
+def pcm_info(path, props):
+    return {
+        "codec": props.get("Codec"),
+        "format": pcm_format_name(props["Format"]) if "Format" in props else None,
+        "channels": props.get("Channels"),
+        "rate": props.get("Rate", props.get("Sampling")),
+        "device_path": props.get("Device"),
+        "pcm_path": path,
+    }
+
+
+def aplay_pcm_info():
+    """Parses `bluealsa-aplay -l`, used when the BlueALSA D-Bus API is unavailable"""
+    result = subprocess.check_output(["bluealsa-aplay", "-l"], text=True)
+    for line in result.splitlines():
+        if "A2DP" in line:
+            match = re.search(r"A2DP \((.*?)\): (.*?) (\d+) channels (\d+) Hz", line)
+            if match:
+                codec, fmt, channels, rate = match.groups()
+                return {
+                    "codec": codec,
+                    "format": fmt,
+                    "channels": int(channels),
+                    "rate": int(rate)
+                }
+    return None
+
+
+class BlueAlsaPcmCache():
+    """Cached view of the A2DP PCMs exported by BlueALSA over D-Bus.
+
+    The PCM list is fetched once and then kept current from BlueALSA's own
+    InterfacesAdded, InterfacesRemoved and PropertiesChanged signals. Until
+    those signals are subscribed every lookup queries BlueALSA directly.
+    """
+
+    def __init__(self, get_bus):
+        self.get_bus = get_bus
+        self._lock = threading.Lock()
+        self._pcms = None
+        self._info = {}
+        self._subscribed = False
+
+    def subscribe(self):
+        bus = self.get_bus()
+        bus.subscribe(
+            sender=bluealsa_service,
+            iface="org.freedesktop.DBus.Properties",
+            signal="PropertiesChanged",
+            arg0=PCM_IFACE,
+            signal_fired=self.on_properties_changed
+        )
+        for signal in ("InterfacesAdded", "InterfacesRemoved"):
+            bus.subscribe(
+                sender=bluealsa_service,
+                iface="org.freedesktop.DBus.ObjectManager",
+                signal=signal,
+                signal_fired=self.on_interfaces_changed
+            )
+        bus.subscribe(
+            sender="org.freedesktop.DBus",
+            iface="org.freedesktop.DBus",
+            signal="NameOwnerChanged",
+            arg0=bluealsa_service,
+            signal_fired=self.on_interfaces_changed
+        )
+        self._subscribed = True
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._pcms = None
+                self._info.clear()
+            else:
+                self._info.pop(path, None)
+
+    def on_properties_changed(self, sender, path, iface, signal, params):
+        _, changed, invalidated = params
+        with self._lock:
+            props = (self._pcms or {}).get(path)
+            if props is None:
+                return
+            props.update(changed)
+            for name in invalidated:
+                props.pop(name, None)
+            self._info.pop(path, None)
+
+    def on_interfaces_changed(self, *args):
+        self.invalidate()
+
+    def get(self, device_path=None):
+        """Returns PCM info of the A2DP PCM for device_path, or the first one"""
+        pcms = self._load()
+        for path, props in pcms.items():
+            if not str(props.get("Transport", "")).startswith("A2DP"):
+                continue
+            if device_path is not None and props.get("Device") != device_path:
+                continue
+            with self._lock:
+                info = self._info.get(path)
+                if info is None:
+                    info = pcm_info(path, props)
+                    if self._subscribed:
+                        self._info[path] = info
+            return dict(info)
+        return None
+
+    def _load(self):
+        with self._lock:
+            if self._pcms is not None:
+                return dict(self._pcms)
+
+        manager = self.get_bus().get(bluealsa_service, bluealsa_path)
+        if hasattr(manager, "GetManagedObjects"):
+            objects = manager.GetManagedObjects()
+            pcms = {
+                path: dict(interfaces[PCM_IFACE])
+                for path, interfaces in objects.items()
+                if PCM_IFACE in interfaces
+            }
+        else:
+            pcms = {path: dict(props) for path, props in manager.GetPCMs().items()}
+
+        with self._lock:
+            if self._subscribed:
+                self._pcms = pcms
+        return dict(pcms)
@@ -1,192 +1,489 @@
 
 import logging
 import pydbus
+import threading
 import time
-import subprocess
-import re
 
 from mopidy.core.listener import CoreListener
-from mopidy.models import Album, Artist, Track, TlTrack
 from mopidy.types import PlaybackState, DurationMs
 
-from gi.repository import GLib, GObject
-
-discovery_time = 20
-mainloop = GLib.MainLoop()
+from .bluez_objects import (
+    BluezObjectTree,
+    ADAPTER_IFACE,
+    DEVICE_IFACE,
+    PLAYER_IFACE,
+    TRANSPORT_IFACE,
+)
+from .adapters import AdapterRegistry
+from .backend import bluez_service, make_backend
+from .agent import PairingAgent
+from .a2dp import CodecConfigCache, decode_a2dp_config
+from .bluealsa import BlueAlsaPcmCache, aplay_pcm_info
+from .connection import ConnectionManager
+from .device_registry import DeviceRegistry, registry_file
+from .metadata import TrackMetadataStage
+from .metrics import (
+    signal_handler_errors,
+    signal_handler_seconds,
+    signals_received,
+    timed_dbus_call,
+)
+from .discovery import DiscoveryManager, discovery_time
+from .dispatch import EventDispatcher
+from .mainloop import BluetoothMainLoop
+from .position import PlayerClocks
+from .prune import DevicePruner
+from .volume import VolumeSync
+from .workers import DbusWorkerPool
 
 logger = logging.getLogger(__name__)
 
-bus = pydbus.SystemBus()
+# PropertiesChanged is only subscribed for these interfaces of org.bluez
+signal_interfaces = (ADAPTER_IFACE, DEVICE_IFACE, PLAYER_IFACE, TRANSPORT_IFACE)
+
+_bus = None
+_bus_lock = threading.Lock()
+
 
-bluez_service = 'org.bluez'
-mngr = bus.get(bluez_service, '/')
+def get_bus():
+    """Connects to the system bus on first use"""
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = pydbus.SystemBus()
+        return _bus
 
-adapter_path = '/org/bluez/hci0'
-adapter = bus.get(bluez_service, adapter_path) 
-bluez = bus.get("org.freedesktop.DBus", "/org/bluez")
+
+object_tree = BluezObjectTree()
+discovery = DiscoveryManager(object_tree)
+bluealsa_pcms = BlueAlsaPcmCache(get_bus)
+codec_configs = CodecConfigCache()
+object_tree.add_listener(codec_configs.on_object_event)
+adapters = AdapterRegistry(object_tree)
+player_clocks = PlayerClocks(object_tree)
+object_tree.add_listener(player_clocks.on_object_event)
+device_registry = DeviceRegistry(object_tree=object_tree)
+object_tree.add_listener(device_registry.on_object_event)
 
 
 class BluetoothDbusController():
     def __init__(self, core, config):
         self.config = config
         self.core = core
+        self.object_tree = object_tree
+        self.mainloop = BluetoothMainLoop()
+        self.events = EventDispatcher(max_size=config['bluetooth-manager']['event_queue_size'])
+        self.backend = make_backend(
+            config['bluetooth-manager']['backend'], get_bus, deliver=self.mainloop.call_soon
+        )
+        object_tree.add_listener(self.backend.on_object_event)
+        adapters.configure(config['bluetooth-manager'])
+        discovery.configure(config['bluetooth-manager'])
+        self._load_device_registry()
         self.devices = []
         self.track = None
         self.track_mem = None
+        self.metadata = TrackMetadataStage(
+            self._publish_track, schedule=lambda flush: self.events.submit(("track",), flush)
+        )
+        self.connections = ConnectionManager(
+            object_tree, self.backend, autoconnect=config['bluetooth-manager']['autoconnect'],
+            history=device_registry,
+        )
+        object_tree.add_listener(self.connections.on_object_event)
+        self.volume = VolumeSync(
+            core, object_tree, self.backend,
+            initial_volume=config['bluetooth-manager']['initial-volume'],
+            max_rate=config['bluetooth-manager']['volume_write_rate'],
+        )
+        object_tree.add_listener(self.volume.on_object_event)
+        ext_config = config['bluetooth-manager']
+        self.audio_sink = None
+        if ext_config['attach_audio_sink']:
+            from .audio_sink import BluetoothAudioSink
+            self.audio_sink = BluetoothAudioSink(
+                object_tree, self._describe_stream, config['audio']['output'],
+                latency_ms=ext_config['audio_sink_latency'],
+                buffer_ms=ext_config['audio_sink_buffer'],
+            )
+            object_tree.add_listener(self.audio_sink.on_object_event)
+        # Runs the blocking RPC handlers for the HTTP app
+        self.workers = DbusWorkerPool(
+            max_workers=ext_config['rpc_workers'], max_pending=ext_config['rpc_max_pending'],
+        )
+        self.pruner = DevicePruner(object_tree, device_registry, self._remove_device)
+        self.agent = None
+        if ext_config['agent']:
+            self.agent = PairingAgent(
+                object_tree, self.backend, ext_config['pincode'],
+                allow=ext_config['pairing_allow'],
+                deny=ext_config['pairing_deny'],
+                capability=ext_config['agent_capability'],
+                defer=lambda fn, *args: self.events.submit(None, fn, *args),
+            )
+        self.property_handlers = {
+            (ADAPTER_IFACE, "Discovering"): self.on_adapter_discovering,
+            (ADAPTER_IFACE, "Discoverable"): self.on_adapter_discoverable,
+            (DEVICE_IFACE, "Connected"): self.on_device_connected,
+            (PLAYER_IFACE, "Position"): self.on_player_position,
+            (PLAYER_IFACE, "Status"): self.on_player_status,
+            (PLAYER_IFACE, "Track"): self.on_player_track,
+            (TRANSPORT_IFACE, "State"): self.on_transport_state,
+            (TRANSPORT_IFACE, "Volume"): self.on_transport_volume,
+        }
+
+    def _load_device_registry(self):
+        from . import Extension
+        try:
+            data_dir = Extension.get_data_dir(self.config)
+        except Exception as e:
+            logger.warning(f"Bluetooth device registry disabled, no data directory: {e}")
+            return
+        device_registry.load(data_dir / registry_file)
 
     def set_track(self, _track = None):
-        _track_id = 1
-        track = Track(
-            name = _track.get("Title") if _track.get("Title") else 'Bluetooth',
-            artists = frozenset([Artist(name=_track.get("Artist"))]) if _track.get("Artist") else frozenset([Artist(name="Unknown")]),
-            album = Album(name=_track.get("Album")) if _track.get("Album") else None,
-            track_no =  int(_track.get("TrackNumber")) if _track.get("TrackNumber") is not None else None,
-            length = int(_track.get("Duration")) if _track.get("Duration") is not None else None,  
-        )
-        tl_track = TlTrack(_track_id, track=track)
+        self.metadata.set(_track or {})
+
+    def _publish_track(self, previous, tl_track):
+        if previous is not None:
+            CoreListener.send("track_playback_ended", tl_track=previous)
         self.track = tl_track
         self.core.playback.set_metadata(tl_track)
         CoreListener.send("track_playback_started", tl_track=tl_track)
 
-    def on_properties_changed(self, *args):
-        interface = args[1]
-        params = args[4]
-
-        if adapter_path in interface:
-            properties = params[1]
-
-            if "State" in properties:
-                CoreListener.send("options_changed", state=properties["State"])
-            
-            if "Status" in properties:
-                # CoreListener.send("playback_status_changed", status=properties["Status"])
-                if (properties["Status"] == 'playing'):
-                    self.core.playback.set_state(PlaybackState.PLAYING)
-                if (properties["Status"] == 'paused'):
-                    self.core.playback.set_state(PlaybackState.PAUSED)
-
-            if "Connected" in properties and not "Player" in properties:
-                value = properties.get("Connected")
-                self.core.playback.stop()
-                if value:
-                    # self.track_mem = self.core.playback.get_current_track()
-                    CoreListener.send("network_status_changed", connected=value, device=self.get_device(interface))
-                    CoreListener.send("options_changed", input='bluetooth')
-                    self.set_track({})
-                    self.handle_incoming_device_request(self.get_device(interface))
-                else:
-                    self.core.playback.set_state(PlaybackState.STOPPED)
-                    self.core.playback.set_metadata(None)
-                    CoreListener.send("track_playback_ended")
-                    CoreListener.send("network_status_changed", connected=value, device=self.get_device(interface))
-               
-            if "Track" in properties:
-                if self.track is not None:
-                    CoreListener.send("track_playback_ended", tl_track=self.track)
-                
-                _track = properties.get("Track")
-                if _track:
-                    self.set_track(_track)
-
-            if "Volume" in properties:
-                CoreListener.send("volume_changed", volume=properties["Volume"])
-
-            if "Discovering" in properties:
-                CoreListener.send("network_status_changed", discovering=properties["Discovering"])
-
-            if "Discoverable" in properties:
-                CoreListener.send("network_state_changed", discover=properties["Discoverable"])
+    def on_interfaces_added(self, sender, path, iface, signal, params):
+        object_path, interfaces = params
+        object_tree.interfaces_added(object_path, interfaces)
+        if ADAPTER_IFACE in interfaces and object_path in adapters.paths():
+            # Adapters can show up after bluetoothd itself, e.g. on restarts
+            # or when a USB dongle is plugged in
+            self.events.submit(
+                None, self._set_adapter_alias, object_path, self.config['bluetooth-manager']['name']
+            )
+
+
+    def on_interfaces_removed(self, sender, path, iface, signal, params):
+        object_path, interfaces = params
+        object_tree.interfaces_removed(object_path, interfaces)
+
+
+    def on_name_owner_changed(self, sender, path, iface, signal, params):
+        name, old_owner, new_owner = params
+        logger.info(f"{name} owner changed from {old_owner or 'none'} to {new_owner or 'none'}")
+        self.backend.reset()
+        object_tree.reset()
+        if new_owner:
+            self.events.submit(("restore_state",), self._try_restore_state)
+        else:
+            logger.warning("Bluetooth service went away, waiting for it to restart")
+
+
+    def _try_restore_state(self):
+        try:
+            self.restore_state()
+        except Exception as e:
+            logger.warning(f"Failed to restore Bluetooth state: {e}")
+
+
+    def on_properties_changed(self, sender, path, iface, signal, params):
+        """Updates the object tree right away and queues the Mopidy side.
+
+        Handlers run on the event dispatcher, a newer value of the same
+        property of the same object replaces one that is still queued.
+        """
+        interface, changed, invalidated = params
+        with signal_handler_seconds.time(interface, errors=signal_handler_errors):
+            object_tree.properties_changed(path, interface, changed, invalidated)
+
+            for name, value in changed.items():
+                signals_received.inc(interface, name)
+                handler = self.property_handlers.get((interface, name))
+                if handler is not None:
+                    self.events.submit((interface, name, path), handler, path, value)
+
+
+    def on_transport_state(self, path, value):
+        CoreListener.send("options_changed", state=value)
+
+
+    def on_player_status(self, path, value):
+        # CoreListener.send("playback_status_changed", status=value)
+        if (value == 'playing'):
+            self.core.playback.set_state(PlaybackState.PLAYING)
+        if (value == 'paused'):
+            self.core.playback.set_state(PlaybackState.PAUSED)
+
+
+    def on_player_position(self, path, value):
+        # Position also comes with status and track changes, only real
+        # jumps are reported as seeks
+        if player_clocks.take_seek(path) is not None:
+            CoreListener.send("seeked", time_position=value)
+
+
+    def on_device_connected(self, path, value):
+        self.core.playback.stop()
+        if value:
+            # self.track_mem = self.core.playback.get_current_track()
+            CoreListener.send("network_status_changed", connected=value, device=self.get_device(path))
+            CoreListener.send("options_changed", input='bluetooth')
+            self.set_track({})
+            self.handle_incoming_device_request(self.get_device(path))
+        else:
+            self.metadata.reset()
+            self.core.playback.set_state(PlaybackState.STOPPED)
+            self.core.playback.set_metadata(None)
+            CoreListener.send("track_playback_ended")
+            CoreListener.send("network_status_changed", connected=value, device=self.get_device(path))
+
+
+    def on_player_track(self, path, value):
+        if value:
+            self.metadata.submit(value)
+
+
+    def on_transport_volume(self, path, value):
+        self.volume.on_transport_volume(path, value)
+
+
+    def on_adapter_discovering(self, path, value):
+        CoreListener.send("network_status_changed", discovering=value)
+
+
+    def on_adapter_discoverable(self, path, value):
+        CoreListener.send("network_state_changed", discover=value)
+
+
+    def start(self):
+        """Starts the main loop and event threads and subscribes to BlueZ.
+
+        Returns a Future that resolves once the subscriptions are in place.
+        """
+        self.events.start()
+        self.backend.start()
+        self.mainloop.start()
+        self.start_prune_policy()
+        return self.mainloop.call(self.start_dbus_listener)
+
+
+    def stop(self):
+        self.pruner.stop()
+        self.connections.stop()
+        adapters.stop()
+        self.workers.shutdown()
+        self.mainloop.stop()
+        self.backend.stop()
+        self.events.stop()
+
+
+    def start_prune_policy(self):
+        ext_config = self.config['bluetooth-manager']
+        interval = ext_config['prune_interval']
+        max_devices = ext_config['prune_max_devices']
+        max_age = ext_config['prune_max_age']
+        if not interval or (max_devices is None and max_age is None):
+            return
+        self.pruner.start_policy(
+            interval * 60,
+            max_devices=max_devices,
+            max_age=max_age * 86400 if max_age is not None else None,
+            keep_trusted=ext_config['prune_keep_trusted'],
+        )
 
 
     def start_dbus_listener(self):
-        bus.subscribe(
-            iface="org.freedesktop.DBus.Properties",
-            signal="PropertiesChanged",
-            signal_fired=self.on_properties_changed
+        """Subscribes to BlueZ signals, to be run on the main loop thread"""
+        backend = self.backend
+        for interface in signal_interfaces:
+            backend.subscribe(
+                bluez_service, "org.freedesktop.DBus.Properties", "PropertiesChanged",
+                self.on_properties_changed, arg0=interface,
+            )
+        backend.subscribe(
+            bluez_service, "org.freedesktop.DBus.ObjectManager", "InterfacesAdded",
+            self.on_interfaces_added,
+        )
+        backend.subscribe(
+            bluez_service, "org.freedesktop.DBus.ObjectManager", "InterfacesRemoved",
+            self.on_interfaces_removed,
+        )
+        backend.subscribe(
+            "org.freedesktop.DBus", "org.freedesktop.DBus", "NameOwnerChanged",
+            self.on_name_owner_changed, arg0=bluez_service,
+        )
+        backend.subscribe(
+            bluez_service, DEVICE_IFACE, "Disconnected", self.connections.on_disconnected,
         )
+        # BlueALSA and the exported agent stay on the pydbus connection,
+        # BlueZ calls the agent back on the connection that registered it
+        bluealsa_pcms.subscribe()
+        if self.agent is not None:
+            self.agent.publish(get_bus())
+        try:
+            self.restore_state()
+        except Exception as e:
+            logger.warning(f"Bluetooth service not available yet, waiting for it to start: {e}")
+
+
+    @timed_dbus_call("restore_state")
+    def restore_state(self):
+        """Rebuilds local state from BlueZ on startup and after bluetoothd restarts"""
+        object_tree.seed(self.backend.get_managed_objects())
+        device_registry.sync(object_tree.devices())
+        self.register_agent()
+        self.adapter_set_name(self.config['bluetooth-manager']['name'])
         connected_device = self.get_device()
         if (connected_device):
             self.set_track({})
             CoreListener.send("options_changed", input='bluetooth')
+        if self.audio_sink is not None:
+            # Seeding sends no tree events, a phone may already be streaming
+            self.mainloop.call_soon(self.audio_sink.attach_active)
+        self.connections.start_autoconnect()
+
+
+    def register_agent(self):
+        if self.agent is None:
+            return
+        try:
+            self.agent.register(get_bus(), bluez_service)
+        except Exception as e:
+            logger.warning(f"Failed to register Bluetooth pairing agent: {e}")
 
 
+    def _object_tree(self):
+        """Returns the object tree mirror, seeding it on first use"""
+        if not object_tree.seeded:
+            object_tree.seed(self.backend.get_managed_objects())
+            device_registry.sync(object_tree.devices())
+        return object_tree
+
+
+    @timed_dbus_call("adapter_power")
     def adapter_power(self, state):
         """Bluetooth power switch"""
         try:
-            value = GLib.Variant("b", state)
-            adapter.Set("org.bluez.Adapter1", "Powered", value)
+            self._object_tree()
+            adapters.run_all(lambda path: self.backend.set_property(path, ADAPTER_IFACE, "Powered", state))
             return True
         except Exception:
             raise RuntimeError(f"Failed to change adapter power state")
 
 
+    def _set_adapter_alias(self, path, name):
+        alias = adapters.alias_for(path, name)
+        logger.info(f"Starting bluetooth adapter {path} with name {alias}")
+        self.backend.set_property(path, ADAPTER_IFACE, "Alias", alias)
+
+
+    @timed_dbus_call("adapter_set_name")
     def adapter_set_name(self, name):
         """Sets Name to bluetooth device """
 
         try:
-            logger.info(f"Starting bluetooth with name {name}")
-            name_alias = GLib.Variant("s", name)
-            adapter.Set("org.bluez.Adapter1","Alias", name_alias)
-
+            self._object_tree()
+            adapters.run_all(lambda path: self._set_adapter_alias(path, name))
             return True
         except Exception:
                 raise RuntimeError(f"Failed to set device name {name}")
+
+
+    def _set_adapter_discoverable(self, path):
+        self.backend.set_property(path, ADAPTER_IFACE, "Discoverable", True)
+        self.backend.set_property(path, ADAPTER_IFACE, "Pairable", True)
+
         
+    @timed_dbus_call("set_discoverable")
     def set_discoverable(self):
         try:
-            adapter.Set("org.bluez.Adapter1", "Discoverable", GLib.Variant("b", True))
-            adapter.Set("org.bluez.Adapter1", "Pairable", GLib.Variant("b", True))
+            self._object_tree()
+            adapters.run_all(self._set_adapter_discoverable)
             return True
         except Exception:
             raise RuntimeError(f"Failed to set discoverable")
 
 
-    def discover_devices(self):
-        """Scan for trusted Bluetooth devices and return a list of device Name and MAC addresses."""
-        logger.info("Scanning for available Bluetooth devices...")
-        def end_discovery():
-            """Handler for end of discovery"""
-            mainloop.quit()
-            adapter.StopDiscovery()
+    def _start_adapter_scan(self, path):
+        self.backend.set_property(path, ADAPTER_IFACE, "Powered", True)
+        self._set_adapter_discoverable(path)
+        try:
+            self.backend.set_discovery_filter(path, discovery.scan_filter())
+        except Exception as e:
+            logger.warning(f"Failed to set discovery filter on {path}, scanning unfiltered: {e}")
+        self.backend.start_discovery(path)
 
-        self.adapter_power(True)
-        self.set_discoverable()
-        adapter.StartDiscovery()
-        GLib.timeout_add_seconds(discovery_time, end_discovery)
-        mainloop.run()
 
-        mng_objs = mngr.GetManagedObjects()       
-        devices = []
-        for path in mng_objs:
-            device = mng_objs[path].get('org.bluez.Device1')
-            if device and device.get('Name'):
-                devices.append({
-                    "name": device.get("Name"),
-                    "address": device.get("Address"),
-                    "alias": device.get("Alias"),
-                    "icon": device.get("Icon"),
-                    "device_path": path
-                })
-        self.devices = devices
-        logger.info(f"Found ({len(devices)}) Bluetooth devices.")
-        return devices
-       
+    @timed_dbus_call("start_scan")
+    def _start_scan(self):
+        """Starts discovery on all adapters at once"""
+        adapters.run_all(self._start_adapter_scan)
+
+
+    @timed_dbus_call("stop_scan")
+    def _stop_scan(self):
+        adapters.run_all(self.backend.stop_discovery)
+
+
+    def discover_devices(self, address=None, count=None, timeout=discovery_time):
+        """Starts a discovery session and returns its id right away.
+
+        Found devices are collected as BlueZ reports them, use discover_poll
+        to fetch them. The session ends early once the device with address
+        or count devices have been found.
+        """
+        self._object_tree()
+        return discovery.start(self._start_scan, self._stop_scan, address, count, timeout)
+
+
+    def discover_poll(self, session_id, since=0):
+        """Returns devices found by a discovery session after index since"""
+        return discovery.poll(session_id, since)
+
+
+    def discover_stop(self, session_id):
+        """Stops a discovery session"""
+        return discovery.stop(session_id)
 
 
     def get_devices(self):
-        """Gets the list of devices cached from last scan"""
-        mng_objs = mngr.GetManagedObjects()       
+        """Gets the list of devices cached from last scan.
+
+        Devices remembered in the registry are listed as well, so there is
+        something to show before bluetoothd is up after a reboot.
+        """
+        try:
+            live = self._object_tree().devices()
+        except Exception as e:
+            logger.debug(f"BlueZ not available, listing remembered devices only: {e}")
+            live = []
+
         devices = []
-        for path in mng_objs:
-            device = mng_objs[path].get('org.bluez.Device1')
-            if device and device.get('Name'):
+        seen = set()
+        for path, device in live:
+            if device.get('Name'):
+                remembered = device_registry.get(device.get("Address")) or {}
+                seen.add(device.get("Address"))
                 devices.append({
                     "device_path": path,
                     "name": device.get("Name"),
                     "address": device.get("Address"),
                     "alias": device.get("Alias"),
                     "icon": device.get("Icon"),
-                    "connected":device.get("Connected")
+                    "connected":device.get("Connected"),
+                    "last_connected": remembered.get("last_connected"),
+                    "connections": remembered.get("connections", 0),
+                })
+        for device in device_registry.devices():
+            if device["address"] not in seen and device.get("name"):
+                devices.append({
+                    "device_path": device.get("device_path"),
+                    "name": device.get("name"),
+                    "address": device["address"],
+                    "alias": device.get("alias"),
+                    "icon": device.get("icon"),
+                    "connected": False,
+                    "last_connected": device.get("last_connected"),
+                    "connections": device.get("connections", 0),
                 })
         return devices
 
@@ -196,132 +493,112 @@ class BluetoothDbusController():
            currently connected device.
         """
         if device_path is not None:
-            try:
-                device = bus.get(bluez_service, device_path)
-                return {
-                            "device_path": device_path,
-                            "adapter": device.Adapter,
-                            "alias": device.Alias,
-                            "address": device.Address,
-                            "icon": device.Icon,
-                            "paired": device.Paired,
-                            "trusted": device.Trusted,
-                            "class": device.Class,
-                            "bonded":device.Bonded,
-                        }
-            except Exception:
+            device = self._object_tree().get(device_path, DEVICE_IFACE)
+            if device is None:
                 raise RuntimeError(f"Failed to device info for {device_path}")
+            return {
+                        "device_path": device_path,
+                        "adapter": device.get("Adapter"),
+                        "alias": device.get("Alias"),
+                        "address": device.get("Address"),
+                        "icon": device.get("Icon"),
+                        "paired": device.get("Paired"),
+                        "trusted": device.get("Trusted"),
+                        "class": device.get("Class"),
+                        "bonded":device.get("Bonded"),
+                    }
         else:
-            mng_objs = mngr.GetManagedObjects()      
-            for path in mng_objs:
-                device = mng_objs[path].get('org.bluez.Device1')
-                if device and device.get('Connected'):
-                     return {
-                                "device_path": path,
-                                "name": device.get("Name"),
-                                "address": device.get("Address"),
-                                "alias": device.get("Alias"),
-                                "icon": device.get("Icon"),
-                                "connected":device.get("Connected")
-                            }
+            for path, device in self._object_tree().connected_devices():
+                return {
+                            "device_path": path,
+                            "name": device.get("Name"),
+                            "address": device.get("Address"),
+                            "alias": device.get("Alias"),
+                            "icon": device.get("Icon"),
+                            "connected":device.get("Connected")
+                        }
 
 
     def parse_a2dp_config(self, codec, config):
-        if codec == 0:  # SBC
-            freq_map = {
-                0b10000000: 16000,
-                0b01000000: 32000,
-                0b00100000: 44100,
-                0b00010000: 48000
-            }
-            channel_map = {
-                0b00001000: "Mono",
-                0b00000100: "Dual Channel",
-                0b00000010: "Stereo",
-                0b00000001: "Joint Stereo"
-            }
-
-            freq = next((v for k, v in freq_map.items() if config[0] & k), None)
-            channel = next((v for k, v in channel_map.items() if config[0] & k), None)
-            return {"codec": "SBC", "rate": freq, "channels": channel}
-
-        elif codec == 2:  # AAC
-            freq_map = {
-                0x80: 8000, 0x40: 11025, 0x20: 12000, 0x10: 16000,
-                0x08: 22050, 0x04: 24000, 0x02: 32000, 0x01: 44100,
-                0x00: 48000  # fallback
-            }
-            rate_byte = config[1]
-            freq = freq_map.get(rate_byte & 0xFF, "Unknown")
-            return {"codec": "AAC", "rate": freq, "channels": "Unknown"}
-
-        return {"codec": f"Unknown ({codec})", "rate": "Unknown", "channels": "Unknown"}
+        return decode_a2dp_config(codec, config)
 
 
     def _get_audio_pcm_info(self, device_path):
         try:
-            mng_objs = mngr.GetManagedObjects()      
-            for path in mng_objs:
-                device = mng_objs[path].get('org.bluez.MediaTransport1')
-                if device is not None and device.get('Device') == device_path:
-                    return self.parse_a2dp_config(device.get('Codec'), device.get('Configuration'))
+            transport_path, transport = self._object_tree().transport_for(device_path)
+            if transport is not None:
+                return codec_configs.decode(transport_path, transport.get('Codec'), transport.get('Configuration'))
 
         except Exception as e:
             return f"Error retrieving PCM info: {e}"
         
     
     def get_audio_pcm_info(self):
+        """Gets the PCM format of the active A2DP stream from BlueALSA"""
+        connected_device = self.get_device()
+        device_path = connected_device.get("device_path") if connected_device else None
         try:
-            result = subprocess.check_output(["bluealsa-aplay", "-l"], text=True)
-            lines = result.splitlines()
-            for line in lines:
-                if "A2DP" in line:
-                    match = re.search(r"A2DP \((.*?)\): (.*?) (\d+) channels (\d+) Hz", line)
-                    if match:
-                        codec, fmt, channels, rate = match.groups()
-                        return {
-                            "codec": codec,
-                            "format": fmt,
-                            "channels": int(channels),
-                            "rate": int(rate)
-                        }
+            info = bluealsa_pcms.get(device_path)
+        except Exception as e:
+            logger.debug(f"BlueALSA D-Bus query failed, falling back to bluealsa-aplay: {e}")
+            try:
+                info = aplay_pcm_info()
+            except Exception as e:
+                return {"error": str(e)}
+        if info is not None and device_path is not None:
+            info["a2dp"] = self._get_audio_pcm_info(device_path)
+        return info
+
+    def _describe_stream(self, transport_path, device_path):
+        """Sample format, rate and channels of a transport's PCM"""
+        stream = {}
+        try:
+            stream.update(bluealsa_pcms.get(device_path) or {})
+        except Exception as e:
+            logger.debug(f"BlueALSA PCM of {device_path} unavailable: {e}")
+        transport = object_tree.get(transport_path, TRANSPORT_IFACE) or {}
+        try:
+            a2dp = codec_configs.decode(transport_path, transport.get('Codec'), transport.get('Configuration'))
+            stream.update({key: a2dp[key] for key in ("rate", "channels") if a2dp.get(key)})
         except Exception as e:
-            return {"error": str(e)}
+            logger.debug(f"Failed to decode A2DP configuration of {transport_path}: {e}")
+        return stream
+
+
+    def get_audio_sink(self):
+        """Gets latency and dropout statistics of the attached audio sink"""
+        if self.audio_sink is None:
+            return {"attached": False, "enabled": False}
+        return {"enabled": True, **self.audio_sink.stats()}
+
 
     def get_player(self):
         """Gets device media player information"""
-        player_path = None
         get_connected_device = self.get_device()
         
         try:
-            mng_objs = mngr.GetManagedObjects()       
-            for path, interfaces in mng_objs.items():
-                if "org.bluez.MediaPlayer1" in interfaces:
-                     player_path = path
-
-            if player_path is not None and get_connected_device.get("device_path") in player_path:         
-                device = bus.get(bluez_service, player_path)
+            player_path, player = self._object_tree().player_for(get_connected_device.get("device_path"))
+            if player is not None:
                 device_player = {
-                                "status": device.Status,
-                                "device_path": device.Device,
+                                "status": player.get("Status"),
+                                "device_path": player.get("Device"),
                                 "player_path": player_path,
-                                "name": device.Name,
-                                "track": device.Track,
-                                "type": device.Type,
-                                "position": device.Position,
+                                "name": player.get("Name"),
+                                "track": player.get("Track"),
+                                "type": player.get("Type"),
+                                "position": player_clocks.position(player_path, player),
                             }
                 return device_player
         except Exception:
             return "Not supported on this device"
         
 
+    @timed_dbus_call("device_trust")
     def device_trust(self, device_path):
         """Trusts a bluetooth devices with mac address"""
         try:
             logger.debug(f"Attempting to Trust to {device_path}...")
-            device = bus.get(bluez_service, device_path)
-            value = GLib.Variant("b", True)
-            device.Set("org.bluez.Device1","Trusted",value)
+            self.backend.set_property(device_path, DEVICE_IFACE, "Trusted", True)
             return True
         except Exception:
                 raise RuntimeError(f"Failed to trust device {device_path}")
@@ -331,14 +608,10 @@ class BluetoothDbusController():
         """Handles incoming bluetooth request"""
         incoming_device_path = incoming_device.get("device_path")
         self.device_trust(incoming_device_path)
-        devices = self.get_devices()
-        
-        for device in devices:
-            device_path = device.get("device_path")
-            if device_path != incoming_device_path:
-                self.device_disconnect(device_path)
+        self.connections.disconnect_others(incoming_device_path, block=False)
 
 
+    @timed_dbus_call("device_connect")
     def device_connect(self, device_path):
         """Connects to bluetooth device with address."""
         try:
@@ -347,84 +620,107 @@ class BluetoothDbusController():
             get_new_device_path = None
             get_new_device = self.get_device(device_path)
             if get_new_device:
-                get_new_device_path = device_path
-
-            devices = self.get_devices()
-            for device in devices:
-                _device_path = device.get("device_path")
-                if _device_path and _device_path != get_new_device_path:
-                    self.device_disconnect(_device_path)
+                # A device paired with several adapters is connected through
+                # the one that currently carries the fewest connections
+                candidates = [path for path, _ in object_tree.devices_by_address(get_new_device["address"])]
+                get_new_device_path = adapters.least_loaded(candidates) or device_path
+                if get_new_device_path != device_path:
+                    get_new_device = self.get_device(get_new_device_path)
 
             if get_new_device_path:
-                device = bus.get(bluez_service, get_new_device_path)
-                self.device_trust(get_new_device_path)
-                device.Connect()
+                self.connections.connect(get_new_device_path)
             return get_new_device
         
         except Exception:
             raise RuntimeError(f"Failed to connect device {device_path}")
 
 
+    @timed_dbus_call("device_disconnect")
     def device_disconnect(self, device_path):
         """Disconnects a bluetooth device"""
         try:
             logger.debug(f"Disconnecting bluetooth device  {device_path}")
-            device = bus.get(bluez_service, device_path)
-            if hasattr(device, "Disconnect"):
-                device.Disconnect()
-            return True
+            return self.connections.disconnect(device_path)
         except Exception:
             raise RuntimeError(f"Failed to disconnect device {device_path}")
         
 
+    def get_connection_states(self):
+        """Gets the connection state of every device the extension has seen"""
+        return self.connections.states()
+
+
+    @timed_dbus_call("device_remove")
     def device_remove(self, device_path):
         """Removes a bluetooth devices."""
         try:
             logger.debug(f"Removing bluetooth device {device_path}")
-            adapter.RemoveDevice(device_path)
+            self._remove_device(device_path)
             return True
         except Exception:
             raise RuntimeError(f"Failed to remove device {device_path}")
+
+
+    def _remove_device(self, device_path):
+        device = object_tree.get(device_path, DEVICE_IFACE) or {}
+        self.backend.remove_device(adapters.adapter_of(device_path), device_path)
+        if device.get("Address"):
+            device_registry.forget(device["Address"])
+
+
+    def prune_devices(self, max_devices=None, max_age_days=None, keep_trusted=False):
+        """Removes stale devices concurrently.
+
+        Returns a job right away, its progress is pushed to WebSocket
+        clients and can be polled with prune_status.
+        """
+        self._object_tree()
+        max_age = max_age_days * 86400 if max_age_days is not None else None
+        return self.pruner.prune(max_devices, max_age, keep_trusted)
+
+
+    def prune_status(self, job_id):
+        """Gets the progress of a prune job"""
+        return self.pruner.status(job_id)
         
 
+    def _player_command(self, path, command):
+        """Sends command to the player at path, or to the player of the device at path"""
+        tree = self._object_tree()
+        player_path = path if tree.get(path, PLAYER_IFACE) is not None else tree.player_for(path)[0]
+        if player_path is not None:
+            self.backend.player_command(player_path, command)
+        return True
+
+
+    @timed_dbus_call("player_stop")
     def player_stop(self, device_path):
         """Bluetooth device player Stop command"""
-        device = bus.get(bluez_service, device_path)
-        if hasattr(device, "Stop"):
-            device.Stop()
-        return True
+        return self._player_command(device_path, "Stop")
     
 
+    @timed_dbus_call("player_play")
     def player_play(self, device_path):
         """Bluetooth device player Play command"""
-        device = bus.get(bluez_service, device_path)
-        if hasattr(device, "Play"):
-            device.Play()
-        return True
+        return self._player_command(device_path, "Play")
 
 
+    @timed_dbus_call("player_pause")
     def player_pause(self, device_path):
         """Bluetooth device player Pause command"""
-        device = bus.get(bluez_service, device_path)
-        if hasattr(device, "Pause"):
-            device.Pause()
-        return True
+        return self._player_command(device_path, "Pause")
 
 
+    @timed_dbus_call("player_prev")
     def player_prev(self, device_path):
         """Bluetooth device player Previous command"""
-        device = bus.get(bluez_service, device_path)
-        if hasattr(device, "Previous"):
-            device.Previous()
-        return True
+        return self._player_command(device_path, "Previous")
     
 
+    @timed_dbus_call("player_next")
     def player_next(self, device_path):
         """Bluetooth device player Next command"""
-        device = bus.get(bluez_service, device_path)
-        if hasattr(device, "Next"):
-            device.Next()
-        return True
+        return self._player_command(device_path, "Next")
 
 
     
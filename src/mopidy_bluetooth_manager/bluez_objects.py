@@ -0,0 +1,204 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+ADAPTER_IFACE = "org.bluez.Adapter1"
+DEVICE_IFACE = "org.bluez.Device1"
+PLAYER_IFACE = "org.bluez.MediaPlayer1"
+TRANSPORT_IFACE = "org.bluez.MediaTransport1"
+
+
+class BluezObjectTree():
+    """Local mirror of the BlueZ object tree.
+
+    Seeded once from ObjectManager.GetManagedObjects and then kept up to date
+    from InterfacesAdded, InterfacesRemoved and PropertiesChanged signals, so
+    read paths never need a round trip to bluetoothd.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._objects = {}
+        self._seeded = False
+        self._by_address = {}
+        self._connected = set()
+        self._players = {}
+        self._transports = {}
+        self._listeners = []
+
+    @property
+    def seeded(self):
+        return self._seeded
+
+    def seed(self, managed_objects):
+        """Replaces the mirror with a full GetManagedObjects result"""
+        with self._lock:
+            self._clear()
+            for path, interfaces in managed_objects.items():
+                self._objects[path] = {
+                    name: dict(props) for name, props in interfaces.items()
+                }
+                self._index(path)
+            self._seeded = True
+        logger.debug(f"BlueZ object tree seeded with {len(self._objects)} objects")
+
+    def add_listener(self, listener):
+        """Registers listener(event, path, interface, changed) for tree updates
+
+        event is one of "added", "removed" or "changed". Listeners are called
+        after the mirror has been updated, outside of the tree lock.
+        """
+        with self._lock:
+            self._listeners = [*self._listeners, listener]
+
+    def remove_listener(self, listener):
+        with self._lock:
+            self._listeners = [item for item in self._listeners if item != listener]
+
+    def reset(self):
+        """Drops all mirrored state, the next read will reseed"""
+        with self._lock:
+            self._clear()
+            self._seeded = False
+
+    def interfaces_added(self, path, interfaces):
+        with self._lock:
+            self._unindex(path)
+            entry = self._objects.setdefault(path, {})
+            for name, props in interfaces.items():
+                entry[name] = dict(props)
+            self._index(path)
+        for name, props in interfaces.items():
+            self._notify("added", path, name, props)
+
+    def interfaces_removed(self, path, interfaces):
+        with self._lock:
+            entry = self._objects.get(path)
+            if entry is None:
+                return
+            self._unindex(path)
+            for name in interfaces:
+                entry.pop(name, None)
+            if entry:
+                self._index(path)
+            else:
+                del self._objects[path]
+        for name in interfaces:
+            self._notify("removed", path, name, {})
+
+    def properties_changed(self, path, interface, changed, invalidated=()):
+        """Applies a PropertiesChanged signal, returns False for unknown objects"""
+        with self._lock:
+            props = self._objects.get(path, {}).get(interface)
+            if props is None:
+                return False
+            self._unindex(path)
+            props.update(changed)
+            for name in invalidated:
+                props.pop(name, None)
+            self._index(path)
+        self._notify("changed", path, interface, changed)
+        return True
+
+    def get(self, path, interface):
+        """Returns a copy of the properties of one interface on an object"""
+        with self._lock:
+            props = self._objects.get(path, {}).get(interface)
+            return dict(props) if props is not None else None
+
+    def has_interface(self, path, interface):
+        with self._lock:
+            return interface in self._objects.get(path, {})
+
+    def find(self, interface):
+        """Returns (path, properties) for every object implementing interface"""
+        with self._lock:
+            return [
+                (path, dict(interfaces[interface]))
+                for path, interfaces in self._objects.items()
+                if interface in interfaces
+            ]
+
+    def devices(self):
+        return self.find(DEVICE_IFACE)
+
+    def devices_by_address(self, address):
+        """Returns (path, properties) of a device on every adapter that knows it"""
+        with self._lock:
+            return [
+                (path, dict(self._objects[path][DEVICE_IFACE]))
+                for path in sorted(self._by_address.get(address.upper(), ()))
+            ]
+
+    def connected_devices(self):
+        with self._lock:
+            return [
+                (path, dict(self._objects[path][DEVICE_IFACE]))
+                for path in sorted(self._connected)
+            ]
+
+    def player_for(self, device_path):
+        """Returns (path, properties) of the MediaPlayer1 for a device"""
+        with self._lock:
+            path = self._players.get(device_path)
+            return path, self.get(path, PLAYER_IFACE)
+
+    def transport_for(self, device_path):
+        """Returns (path, properties) of the MediaTransport1 for a device"""
+        with self._lock:
+            path = self._transports.get(device_path)
+            return path, self.get(path, TRANSPORT_IFACE)
+
+    def _notify(self, event, path, interface, changed):
+        for listener in self._listeners:
+            try:
+                listener(event, path, interface, changed)
+            except Exception:
+                logger.exception(f"BlueZ object tree listener failed for {path}")
+
+    def _clear(self):
+        self._objects.clear()
+        self._by_address.clear()
+        self._connected.clear()
+        self._players.clear()
+        self._transports.clear()
+
+    def _index(self, path):
+        interfaces = self._objects.get(path, {})
+
+        device = interfaces.get(DEVICE_IFACE)
+        if device is not None:
+            if device.get("Address"):
+                self._by_address.setdefault(device["Address"].upper(), set()).add(path)
+            if device.get("Connected"):
+                self._connected.add(path)
+
+        player = interfaces.get(PLAYER_IFACE)
+        if player is not None and player.get("Device"):
+            self._players[player["Device"]] = path
+
+        transport = interfaces.get(TRANSPORT_IFACE)
+        if transport is not None and transport.get("Device"):
+            self._transports[transport["Device"]] = path
+
+    def _unindex(self, path):
+        interfaces = self._objects.get(path, {})
+
+        device = interfaces.get(DEVICE_IFACE)
+        if device is not None:
+            address = (device.get("Address") or "").upper()
+            paths = self._by_address.get(address)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self._by_address[address]
+            self._connected.discard(path)
+
+        for index, interface in (
+            (self._players, PLAYER_IFACE),
+            (self._transports, TRANSPORT_IFACE),
+        ):
+            props = interfaces.get(interface)
+            if props is not None and index.get(props.get("Device")) == path:
+                del index[props["Device"]]
@@ -0,0 +1,245 @@
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from .bluez_objects import DEVICE_IFACE
+from .metrics import dbus_call_errors, dbus_call_seconds
+
+logger = logging.getLogger(__name__)
+
+DISCONNECTED = "disconnected"
+CONNECTING = "connecting"
+CONNECTED = "connected"
+DISCONNECTING = "disconnecting"
+FAILED = "failed"
+
+# Disconnected(reason) values after which the device is not reconnected,
+# the user chose to disconnect on one of the two sides
+user_disconnect_reasons = ("org.bluez.Reason.Local", "org.bluez.Reason.Remote")
+
+
+class ConnectionManager():
+    """Per-device connection state machine.
+
+    Connects with timeouts, disconnects only devices that are actually
+    connected and does so concurrently, and reconnects to the most recently
+    used trusted device on startup and after link loss with exponential
+    backoff. With a device registry as history, devices unused in this
+    session are ordered by how recently and how often they connected. On
+    startup the next candidate is tried once one runs out of attempts.
+    """
+
+    def __init__(
+            self, object_tree, backend, autoconnect=True,
+            connect_timeout=20, disconnect_timeout=5,
+            backoff_initial=2, backoff_max=300, max_attempts=8, history=None):
+        self.object_tree = object_tree
+        self.history = history
+        self.backend = backend
+        self.autoconnect = autoconnect
+        self.connect_timeout = connect_timeout
+        self.disconnect_timeout = disconnect_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._states = {}
+        self._last_used = {}
+        self._disconnect_reasons = {}
+        self._retry = None
+        self._attempts = 0
+        self._candidates = []
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="BluetoothConnect")
+
+    def state(self, device_path):
+        with self._lock:
+            return self._states.get(device_path, DISCONNECTED)
+
+    def states(self):
+        with self._lock:
+            return dict(self._states)
+
+    def stop(self):
+        """Cancels a pending reconnect and queued disconnects, for shutdown"""
+        with self._lock:
+            self._stopped = True
+        self._cancel_retry()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def connect(self, device_path):
+        """Disconnects every other connected device and connects device_path"""
+        self._cancel_retry()
+        with dbus_call_seconds.time("disconnect_others", errors=dbus_call_errors):
+            self.disconnect_others(device_path)
+        self._set_state(device_path, CONNECTING)
+        try:
+            with dbus_call_seconds.time("Device1.SetTrusted", errors=dbus_call_errors):
+                self.backend.set_property(device_path, DEVICE_IFACE, "Trusted", True)
+            with dbus_call_seconds.time("Device1.Connect", errors=dbus_call_errors):
+                self.backend.connect(device_path, timeout=self.connect_timeout)
+        except Exception:
+            self._set_state(device_path, FAILED)
+            raise
+        self._connected(device_path)
+        return True
+
+    def disconnect(self, device_path):
+        """Disconnects a device on request, it is not reconnected afterwards"""
+        if device_path in self._pending_retry_paths():
+            self._cancel_retry()
+        self._set_state(device_path, DISCONNECTING)
+        try:
+            with dbus_call_seconds.time("Device1.Disconnect", errors=dbus_call_errors):
+                self.backend.disconnect(device_path, timeout=self.disconnect_timeout)
+        except Exception:
+            self._set_state(device_path, FAILED)
+            raise
+        self._set_state(device_path, DISCONNECTED)
+        return True
+
+    def disconnect_others(self, keep_path, block=True):
+        """Concurrently disconnects all connected devices except keep_path"""
+        paths = [
+            path for path, _ in self.object_tree.connected_devices()
+            if path != keep_path
+        ]
+        if not paths:
+            return
+        futures = [self._executor.submit(self.disconnect, path) for path in paths]
+        if not block:
+            return
+        wait(futures, timeout=self.disconnect_timeout + 1)
+        for path, future in zip(paths, futures):
+            if not future.done() or future.exception() is not None:
+                logger.warning(f"Failed to disconnect bluetooth device {path}")
+
+    def reconnect_candidates(self):
+        """Trusted, paired devices, most recently used first"""
+        devices = [
+            (path, device.get("Address")) for path, device in self.object_tree.devices()
+            if device.get("Trusted") and device.get("Paired")
+        ]
+        with self._lock:
+            last_used = dict(self._last_used)
+        now = time.time()
+
+        def key(candidate):
+            path, address = candidate
+            score = self.history.score(address, now) if self.history is not None else 0
+            return (-last_used.get(path, 0), -score)
+
+        return [path for path, _ in sorted(devices, key=key)]
+
+    def start_autoconnect(self):
+        """Reconnects trusted devices in order of recent use if none is connected"""
+        connected = self.object_tree.connected_devices()
+        for path, _ in connected:
+            self._connected(path)
+        if not self.autoconnect or connected:
+            return
+        candidates = self.reconnect_candidates()
+        if candidates:
+            with self._lock:
+                self._candidates = candidates[1:]
+            self._attempts = 0
+            self._schedule_retry(candidates[0], 0)
+
+    def on_disconnected(self, sender, path, iface, signal, params):
+        """Handles Device1.Disconnected, which carries the disconnect reason"""
+        with self._lock:
+            self._disconnect_reasons[path] = params[0]
+
+    def on_object_event(self, event, path, interface, changed):
+        if interface != DEVICE_IFACE:
+            return
+        if event == "removed":
+            with self._lock:
+                self._states.pop(path, None)
+                self._last_used.pop(path, None)
+            return
+        if "Connected" not in changed:
+            return
+
+        if changed["Connected"]:
+            self._connected(path)
+            return
+
+        with self._lock:
+            previous = self._states.get(path)
+            self._states[path] = DISCONNECTED
+        if previous == CONNECTED and self.autoconnect:
+            # Not requested through disconnect(), the link was lost
+            with self._lock:
+                self._candidates = []
+            self._attempts = 0
+            self._schedule_retry(path, self.backoff_initial)
+
+    def _connected(self, device_path):
+        with self._lock:
+            self._states[device_path] = CONNECTED
+            self._last_used[device_path] = time.time()
+            self._disconnect_reasons.pop(device_path, None)
+        if device_path in self._pending_retry_paths():
+            self._cancel_retry()
+
+    def _set_state(self, device_path, state):
+        with self._lock:
+            self._states[device_path] = state
+
+    def _schedule_retry(self, device_path, delay):
+        self._cancel_retry()
+        timer = threading.Timer(delay, self._retry_connect, [device_path])
+        timer.daemon = True
+        with self._lock:
+            if self._stopped:
+                return
+            self._retry = (device_path, timer)
+        timer.start()
+
+    def _retry_connect(self, device_path):
+        with self._lock:
+            reason = self._disconnect_reasons.get(device_path)
+            self._retry = None
+            if self._stopped:
+                return
+        if reason in user_disconnect_reasons:
+            logger.info(f"Not reconnecting {device_path}, disconnected by user ({reason})")
+            self._try_next_candidate()
+            return
+        if self.object_tree.connected_devices():
+            return
+
+        self._attempts += 1
+        try:
+            logger.info(f"Reconnecting bluetooth device {device_path} (attempt {self._attempts})")
+            self.connect(device_path)
+            self._attempts = 0
+        except Exception as e:
+            if self._attempts >= self.max_attempts:
+                logger.warning(f"Giving up reconnecting {device_path}: {e}")
+                self._try_next_candidate()
+                return
+            delay = min(self.backoff_initial * 2 ** self._attempts, self.backoff_max)
+            logger.info(f"Reconnecting {device_path} failed, retrying in {delay}s: {e}")
+            self._schedule_retry(device_path, delay)
+
+    def _try_next_candidate(self):
+        with self._lock:
+            if not self._candidates:
+                return
+            device_path = self._candidates.pop(0)
+        self._attempts = 0
+        self._schedule_retry(device_path, 0)
+
+    def _pending_retry_paths(self):
+        with self._lock:
+            return {self._retry[0]} if self._retry else set()
+
+    def _cancel_retry(self):
+        with self._lock:
+            retry, self._retry = self._retry, None
+        if retry is not None:
+            retry[1].cancel()
@@ -0,0 +1,239 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from .a2dp import decode_a2dp_config
+from .bluez_objects import DEVICE_IFACE, TRANSPORT_IFACE
+
+logger = logging.getLogger(__name__)
+
+registry_file = "devices.jsonl"
+
+# Device1 properties mirrored into the registry as they change
+device_fields = {"Alias": "alias", "Name": "name", "Icon": "icon", "Paired": "paired"}
+
+# RSSI moves by a few dB all the time, smaller changes are kept in memory only
+rssi_write_delta = 10
+
+# Reconnect weight halves for every half_life seconds since the last connection
+half_life = 7 * 24 * 3600
+
+
+class DeviceRegistry():
+    """Devices seen by the extension, persisted across restarts.
+
+    Only devices that paired or connected are kept, discovery results that
+    never got that far are not worth remembering. Stored as JSON lines in
+    Mopidy's data directory. Every line is a partial update of one device
+    keyed by address, so a change appends a single line instead of
+    rewriting the file. The file is compacted to one line per device once it
+    has grown well past that.
+    """
+
+    def __init__(self, path=None, compact_ratio=4, object_tree=None):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.object_tree = object_tree
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._persisted_rssi = {}
+        self._lines = 0
+
+    def load(self, path=None):
+        """Reads the registry file, compacting it if needed"""
+        self.path = path or self.path
+        if self.path is None:
+            return
+        devices = {}
+        lines = 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        record = json.loads(line)
+                        address = record.pop("address")
+                    except (ValueError, KeyError, AttributeError):
+                        # A torn last line after a crash, skip it
+                        continue
+                    if record.get("removed"):
+                        devices.pop(address, None)
+                        continue
+                    devices.setdefault(address, {"address": address}).update(record)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to read Bluetooth device registry {self.path}: {e}")
+        # Older registries also recorded devices that were only discovered
+        devices = {
+            address: device for address, device in devices.items()
+            if device.get("paired") or device.get("connections")
+        }
+
+        with self._lock:
+            self._devices = devices
+            self._persisted_rssi = {
+                address: device.get("last_rssi") for address, device in devices.items()
+            }
+            self._lines = lines
+            if self._needs_compact():
+                self._compact()
+        logger.debug(f"Loaded {len(devices)} devices from {self.path}")
+
+    def devices(self):
+        with self._lock:
+            return [dict(device) for device in self._devices.values()]
+
+    def get(self, address):
+        with self._lock:
+            device = self._devices.get(address)
+            return dict(device) if device else None
+
+    def update(self, address, **fields):
+        """Records changed fields of a device, appending them to the file"""
+        if not address:
+            return
+        with self._lock:
+            device = self._devices.get(address)
+            if device is None:
+                device = self._devices[address] = {"address": address}
+                fields = {"first_seen": time.time(), **fields}
+            changed = {name: value for name, value in fields.items() if device.get(name) != value}
+            if not changed:
+                return
+            device.update(changed)
+            if "last_rssi" in changed:
+                persisted = self._persisted_rssi.get(address)
+                if persisted is not None and abs(changed["last_rssi"] - persisted) < rssi_write_delta:
+                    del changed["last_rssi"]
+                else:
+                    self._persisted_rssi[address] = changed["last_rssi"]
+            if changed:
+                self._append({"address": address, **changed})
+
+    def forget(self, address):
+        """Drops a device, e.g. after it was removed from BlueZ"""
+        with self._lock:
+            if self._devices.pop(address, None) is None:
+                return
+            self._persisted_rssi.pop(address, None)
+            self._append({"address": address, "removed": True})
+
+    def connected(self, address, now=None):
+        with self._lock:
+            count = self._devices.get(address, {}).get("connections", 0)
+        self.update(address, last_connected=now or time.time(), connections=count + 1)
+
+    def score(self, address, now=None):
+        """Reconnect weight from how recently and how often a device connected"""
+        with self._lock:
+            device = self._devices.get(address)
+            if not device or not device.get("last_connected"):
+                return 0.0
+            last_connected = device["last_connected"]
+            connections = device.get("connections", 0)
+        age = max(0.0, (now or time.time()) - last_connected)
+        return (1 + math.log1p(connections)) * 0.5 ** (age / half_life)
+
+    def sync(self, devices):
+        """Records the devices of a freshly seeded object tree"""
+        now = time.time()
+        for path, device in devices:
+            # Connections from before a restart were counted when they happened
+            self._record_device(path, device, count_connection=False)
+            # Devices from registries older than first_seen start aging now
+            address = device.get("Address") or _address_of(path)
+            remembered = self.get(address)
+            if remembered and not remembered.get("first_seen"):
+                self.update(address, first_seen=now)
+
+    def on_object_event(self, event, path, interface, changed):
+        if interface == DEVICE_IFACE:
+            if event == "removed":
+                self._forget_unpaired(path)
+            else:
+                self._record_device(path, changed)
+        elif interface == TRANSPORT_IFACE and event == "added":
+            self._record_codec(changed)
+
+    def _record_device(self, path, props, count_connection=True):
+        address = props.get("Address") or _address_of(path)
+        with self._lock:
+            known = address in self._devices
+        if not known:
+            if not (props.get("Paired") or props.get("Connected")):
+                return
+            if self.object_tree is not None:
+                # A change to Paired or Connected carries no names, take them from the tree
+                props = {**(self.object_tree.get(path, DEVICE_IFACE) or {}), **props}
+        fields = {
+            field: props[name] for name, field in device_fields.items()
+            if props.get(name) is not None
+        }
+        if props.get("RSSI") is not None:
+            fields["last_rssi"] = int(props["RSSI"])
+        if fields or "Address" in props:
+            self.update(address, device_path=path, **fields)
+        if props.get("Connected") and count_connection:
+            self.connected(address)
+
+    def _forget_unpaired(self, path):
+        """Drops a device BlueZ let go of, unless it is paired.
+
+        Paired devices stay listed while their adapter is unplugged, removals
+        through the extension forget them explicitly.
+        """
+        address = _address_of(path)
+        with self._lock:
+            device = self._devices.get(address)
+        if device is not None and not device.get("paired"):
+            self.forget(address)
+
+    def _record_codec(self, props):
+        address = _address_of(props.get("Device"))
+        if not address:
+            return
+        try:
+            codec = decode_a2dp_config(props.get("Codec"), props.get("Configuration"))
+        except Exception as e:
+            logger.debug(f"Failed to decode A2DP configuration of {address}: {e}")
+            return
+        self.update(address, last_codec=codec.get("codec"))
+
+    def _append(self, record):
+        if self.path is None:
+            return
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            self._lines += 1
+        except OSError as e:
+            logger.warning(f"Failed to write Bluetooth device registry {self.path}: {e}")
+            return
+        if self._needs_compact():
+            self._compact()
+
+    def _needs_compact(self):
+        return self._lines > self.compact_ratio * len(self._devices) + 16
+
+    def _compact(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for device in self._devices.values():
+                    f.write(json.dumps(device) + "\n")
+            os.replace(tmp_path, self.path)
+            self._lines = len(self._devices)
+        except OSError as e:
+            logger.warning(f"Failed to compact Bluetooth device registry {self.path}: {e}")
+
+
+def _address_of(device_path):
+    """Address from a /org/bluez/hciN/dev_XX_XX_XX_XX_XX_XX object path"""
+    name = str(device_path or "").rsplit("/", 1)[-1]
+    if not name.startswith("dev_"):
+        return None
+    return name[4:].replace("_", ":")
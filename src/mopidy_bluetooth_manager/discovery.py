@@ -0,0 +1,216 @@
+import collections
+import logging
+import threading
+import time
+import uuid
+
+
+from .bluez_objects import DEVICE_IFACE
+
+logger = logging.getLogger(__name__)
+
+discovery_time = 20
+max_finished_sessions = 16
+
+A2DP_SOURCE_UUID = "0000110a-0000-1000-8000-00805f9b34fb"
+
+
+def _rank(device):
+    """Strongest signal first, most recently seen first among equals"""
+    rssi = device.get("rssi")
+    return (-(rssi if rssi is not None else -128), -device["last_seen"])
+
+
+class DiscoverySession():
+    """One caller's view of a shared adapter scan"""
+
+    def __init__(self, address=None, count=None, timeout=discovery_time):
+        self.id = uuid.uuid4().hex
+        self.address = address.upper() if address else None
+        self.count = count
+        self.deadline = time.monotonic() + timeout
+        self.devices = []
+        self.done = False
+        self.reason = None
+        self.timer = None
+        self._seen = {}
+
+    def offer(self, device):
+        """Records a found device, returns True once the session is satisfied"""
+        # The same device can be reported by several adapters, keep the first
+        # and refresh its signal strength from later reports
+        key = (device.get("address") or device["device_path"]).upper()
+        known = self._seen.get(key)
+        if known is None:
+            self._seen[key] = dict(device)
+            self.devices.append(self._seen[key])
+        else:
+            known["last_seen"] = device["last_seen"]
+            if device.get("rssi") is not None:
+                known["rssi"] = device["rssi"]
+        if self.address and (device.get("address") or "").upper() == self.address:
+            return True
+        return bool(self.count) and len(self.devices) >= self.count
+
+    def as_dict(self, since=0):
+        """devices lists new finds after since in discovery order, ranked all
+        devices found so far by signal strength and recency"""
+        return {
+            "session_id": self.id,
+            "devices": [dict(device) for device in self.devices[since:]],
+            "ranked": sorted((dict(device) for device in self.devices), key=_rank),
+            "next": len(self.devices),
+            "done": self.done,
+            "reason": self.reason,
+        }
+
+
+class DiscoveryManager():
+    """Runs a single adapter scan shared by all active discovery sessions.
+
+    Devices are streamed into the sessions as BlueZ reports them through the
+    object tree, so callers see the first device as soon as it is found
+    instead of after the full scan window.
+
+    Scans are filtered in BlueZ with SetDiscoveryFilter, and devices already
+    in the object tree are held to the same transport-independent criteria
+    (service UUIDs and RSSI threshold) before they are offered.
+    """
+
+    def __init__(self, object_tree):
+        self.object_tree = object_tree
+        self.transport = "bredr"
+        self.uuids = [A2DP_SOURCE_UUID]
+        self.rssi = None
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._active = set()
+        self._finished = collections.deque()
+        self._stop_scan = None
+
+    def configure(self, ext_config):
+        self.transport = ext_config.get("discovery_transport") or "auto"
+        self.uuids = [item.lower() for item in ext_config.get("discovery_uuids") or []]
+        self.rssi = ext_config.get("discovery_rssi")
+
+    def scan_filter(self):
+        """Arguments for Adapter1.SetDiscoveryFilter, the backend adds the types"""
+        scan_filter = {"Transport": self.transport}
+        if self.uuids:
+            scan_filter["UUIDs"] = self.uuids
+        if self.rssi is not None:
+            scan_filter["RSSI"] = self.rssi
+        return scan_filter
+
+    def accepts(self, device):
+        """Whether a device passes the UUID and RSSI parts of the filter"""
+        rssi = device.get("RSSI")
+        if self.rssi is not None and rssi is not None and rssi < self.rssi:
+            return False
+        # Devices found by inquiry may not have resolved their services yet
+        uuids = device.get("UUIDs")
+        if self.uuids and uuids:
+            return bool(set(self.uuids) & {item.lower() for item in uuids})
+        return True
+
+    def start(self, start_scan, stop_scan, address=None, count=None, timeout=discovery_time):
+        """Starts a session, joining the running scan if there is one"""
+        session = DiscoverySession(address, count, timeout)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._active.add(session.id)
+            starting = self._stop_scan is None
+            if starting:
+                self._stop_scan = stop_scan
+
+        if starting:
+            self.object_tree.add_listener(self.on_object_event)
+            try:
+                start_scan()
+            except Exception:
+                self._finish(session.id, "error")
+                raise
+            logger.info("Scanning for available Bluetooth devices...")
+
+        for path, device in self.object_tree.devices():
+            if device.get("RSSI") is not None and self.accepts(device):
+                self._offer(path, device)
+
+        timer = threading.Timer(timeout, self._finish, [session.id, "timeout"])
+        timer.daemon = True
+        with self._lock:
+            # Devices already in the tree may have satisfied the session
+            if session.id in self._active:
+                session.timer = timer
+                timer.start()
+        return session.as_dict()
+
+    def poll(self, session_id, since=0):
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise RuntimeError(f"Unknown discovery session {session_id}")
+        return session.as_dict(since)
+
+    def stop(self, session_id):
+        self._finish(session_id, "stopped")
+        return self.poll(session_id)
+
+    def on_object_event(self, event, path, interface, changed):
+        if interface != DEVICE_IFACE or event == "removed":
+            return
+        if event == "changed" and not ({"RSSI", "Name", "UUIDs"} & changed.keys()):
+            return
+        device = self.object_tree.get(path, DEVICE_IFACE)
+        if device is not None and self.accepts(device):
+            self._offer(path, device)
+
+    def _offer(self, path, device):
+        found = {
+            "name": device.get("Name"),
+            "address": device.get("Address"),
+            "alias": device.get("Alias"),
+            "icon": device.get("Icon"),
+            "device_path": path,
+            "rssi": device.get("RSSI"),
+            "last_seen": time.time(),
+        }
+        with self._lock:
+            sessions = [self._sessions[session_id] for session_id in self._active]
+        for session in sessions:
+            wanted = found["name"] or (
+                session.address and (found["address"] or "").upper() == session.address
+            )
+            if wanted and session.offer(found):
+                self._finish(session.id, "found")
+
+    def _finish(self, session_id, reason):
+        with self._lock:
+            if session_id not in self._active:
+                return
+            self._active.discard(session_id)
+            session = self._sessions[session_id]
+            session.done = True
+            session.reason = reason
+            timer, session.timer = session.timer, None
+            self._finished.append(session_id)
+            stop_scan = None
+            if not self._active:
+                stop_scan, self._stop_scan = self._stop_scan, None
+            self._expire_sessions()
+
+        logger.info(
+            f"Discovery session {session_id} finished ({reason}) "
+            f"with {len(session.devices)} Bluetooth devices."
+        )
+        if timer is not None:
+            timer.cancel()
+        if stop_scan is not None:
+            self.object_tree.remove_listener(self.on_object_event)
+            try:
+                stop_scan()
+            except Exception:
+                logger.exception("Failed to stop Bluetooth discovery")
+
+    def _expire_sessions(self):
+        while len(self._finished) > max_finished_sessions:
+            del self._sessions[self._finished.popleft()]
@@ -0,0 +1,104 @@
+import collections
+import itertools
+import logging
+import threading
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+events_pending = registry.gauge(
+    "bluetooth_events_pending", "Bluetooth events waiting to be handed to Mopidy"
+)
+events_coalesced = registry.counter(
+    "bluetooth_events_coalesced_total", "Bluetooth events replaced by a newer event for the same key"
+)
+events_dropped = registry.counter(
+    "bluetooth_events_dropped_total", "Bluetooth events dropped because the queue was full"
+)
+
+
+class EventDispatcher():
+    """Bounded, coalescing queue between D-Bus signals and Mopidy actors.
+
+    Events carry a key, e.g. (interface, property, path). An event whose key
+    is already queued replaces the queued one in place, so a burst of
+    Position or Volume updates reaches Mopidy as its latest value while
+    events keep their relative order. When max_size events are queued the
+    oldest is dropped. Handlers run one at a time on a worker thread, off the
+    main loop that delivers the signals.
+    """
+
+    def __init__(self, max_size=256, name="BluetoothEvents"):
+        self.max_size = max_size
+        self.name = name
+        self._condition = threading.Condition()
+        self._queue = collections.OrderedDict()
+        self._unique = itertools.count()
+        self._thread = None
+        self._stopping = False
+        self._busy = False
+
+    def start(self):
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._condition.notify_all()
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def submit(self, key, fn, *args):
+        """Queues fn(*args), replacing a queued event with the same key.
+
+        A key of None never coalesces.
+        """
+        if key is None:
+            key = ("unique", next(self._unique))
+        with self._condition:
+            if key in self._queue:
+                events_coalesced.inc()
+            elif len(self._queue) >= self.max_size:
+                dropped, _ = self._queue.popitem(last=False)
+                events_dropped.inc()
+                logger.warning(f"Bluetooth event queue full, dropped {dropped}")
+            self._queue[key] = (fn, args)
+            events_pending.set(len(self._queue))
+            self._condition.notify_all()
+
+    def pending(self):
+        with self._condition:
+            return len(self._queue)
+
+    def wait_idle(self, timeout=None):
+        """Waits until the queue is empty and no handler is running"""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._queue and not self._busy, timeout=timeout
+            )
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                _, (fn, args) = self._queue.popitem(last=False)
+                events_pending.set(len(self._queue))
+                self._busy = True
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception(f"Error handling Bluetooth event {fn.__name__}")
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
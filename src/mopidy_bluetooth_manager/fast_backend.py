@@ -0,0 +1,223 @@
+import asyncio
+import collections
+import logging
+import threading
+
+from dbus_fast import BusType, DBusError, Message, MessageType, Variant, unpack_variants
+from dbus_fast.aio import MessageBus
+
+from .backend import BluezBackend, bluez_service
+
+logger = logging.getLogger(__name__)
+
+DBUS_SERVICE = "org.freedesktop.DBus"
+DBUS_PATH = "/org/freedesktop/DBus"
+
+# The libdbus default, applied when a call passes no timeout of its own
+default_timeout = 25
+
+Subscription = collections.namedtuple("Subscription", "sender interface signal arg0 callback")
+
+
+def match_rule(sender, interface, signal, arg0=None):
+    rule = f"type='signal',sender='{sender}',interface='{interface}',member='{signal}'"
+    if arg0 is not None:
+        rule += f",arg0='{arg0}'"
+    return rule
+
+
+class DbusFastBackend(BluezBackend):
+    """asyncio backend on dbus-fast, without introspection.
+
+    Messages are built directly from the static signatures, there are no
+    proxy objects to generate or invalidate. One connection serves every
+    thread: an asyncio loop on its own thread owns it, callers block only
+    on their own reply, so concurrent calls are pipelined on the socket.
+    Signals are matched locally and handed to deliver(callback, *args),
+    which should move them off the asyncio thread, e.g. onto the GLib
+    main loop, so callbacks are free to make blocking calls.
+    """
+
+    name = "dbus-fast"
+
+    def __init__(self, service=bluez_service, deliver=None, bus_address=None):
+        super().__init__(service)
+        self.deliver = deliver
+        self.bus_address = bus_address
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._stopped = False
+        self._connecting = None
+        self._subscriptions = []
+        # Unique connection names of the well-known names subscribed to,
+        # signals carry the unique name as their sender
+        self._owners = {}
+
+    def start(self):
+        with self._lock:
+            self._stopped = False
+            self._start_loop()
+
+    def _start_loop(self):
+        if self._thread is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="BluetoothDbusFast", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._disconnect(), loop).result(timeout=5)
+            # Calls still waiting for a reply fail now instead of at their timeout
+            asyncio.run_coroutine_threadsafe(self._cancel_calls(), loop).result(timeout=5)
+        except Exception as e:
+            logger.debug(f"Failed to close the D-Bus connection cleanly: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+
+    def call(self, path, interface, method, signature="", args=(), timeout=None):
+        timeout = timeout or default_timeout
+        return self._run(self._call(path, interface, method, signature, args, timeout), timeout)
+
+    def variant(self, signature, value):
+        return Variant(signature, value)
+
+    def subscribe(self, sender, interface, signal, callback, arg0=None):
+        subscription = Subscription(sender, interface, signal, arg0, callback)
+        with self._lock:
+            self._subscriptions = [*self._subscriptions, subscription]
+        self._run(self._add_match(subscription), default_timeout)
+        return subscription
+
+    def _run(self, coro, timeout):
+        """Runs coro on the asyncio thread and waits for its result"""
+        with self._lock:
+            if not self._stopped:
+                self._start_loop()
+            loop, thread = self._loop, self._thread
+        if loop is None:
+            coro.close()
+            raise RuntimeError("D-Bus backend is stopped")
+        if threading.current_thread() is thread:
+            coro.close()
+            raise RuntimeError("Blocking D-Bus call made from the dbus-fast loop thread")
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        # The coroutine enforces the call timeout, this only guards the loop
+        return future.result(timeout=timeout + 5)
+
+    async def _connection(self):
+        task = self._connecting
+        if task is None or (task.done() and not self._healthy(task)):
+            task = self._connecting = asyncio.ensure_future(self._open())
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _healthy(task):
+        return not task.cancelled() and task.exception() is None and task.result().connected
+
+    async def _open(self):
+        bus = await MessageBus(bus_address=self.bus_address, bus_type=BusType.SYSTEM).connect()
+        bus.add_message_handler(self._on_message)
+        # After a reconnect the match rules have to be added again
+        self._owners.clear()
+        for subscription in self._subscriptions:
+            await self._add_match(subscription, bus)
+        return bus
+
+    async def _disconnect(self):
+        task, self._connecting = self._connecting, None
+        if task is not None and task.done() and self._healthy(task):
+            task.result().disconnect()
+
+    @staticmethod
+    async def _cancel_calls():
+        current = asyncio.current_task()
+        for task in asyncio.all_tasks():
+            if task is not current:
+                task.cancel()
+
+    async def _bus_call(self, bus, message, timeout):
+        reply = await asyncio.wait_for(bus.call(message), timeout)
+        if reply.message_type == MessageType.ERROR:
+            raise DBusError(reply.error_name, reply.body[0] if reply.body else "", reply)
+        return reply.body
+
+    async def _call(self, path, interface, method, signature, args, timeout):
+        bus = await self._connection()
+        message = Message(
+            destination=self.service, path=path, interface=interface,
+            member=method, signature=signature, body=list(args),
+        )
+        body = await self._bus_call(bus, message, timeout)
+        if not body:
+            return None
+        body = unpack_variants(body)
+        return body[0] if len(body) == 1 else tuple(body)
+
+    async def _dbus_call(self, bus, method, signature="", args=()):
+        message = Message(
+            destination=DBUS_SERVICE, path=DBUS_PATH, interface=DBUS_SERVICE,
+            member=method, signature=signature, body=list(args),
+        )
+        return await self._bus_call(bus, message, default_timeout)
+
+    async def _add_match(self, subscription, bus=None):
+        bus = bus or await self._connection()
+        sender = subscription.sender
+        await self._dbus_call(bus, "AddMatch", "s", [
+            match_rule(sender, subscription.interface, subscription.signal, subscription.arg0)
+        ])
+        if sender == DBUS_SERVICE or sender.startswith(":") or sender in self._owners:
+            return
+        await self._dbus_call(bus, "AddMatch", "s", [
+            match_rule(DBUS_SERVICE, DBUS_SERVICE, "NameOwnerChanged", sender)
+        ])
+        try:
+            [owner] = await self._dbus_call(bus, "GetNameOwner", "s", [sender])
+        except DBusError:
+            owner = None
+        self._owners.setdefault(sender, owner)
+
+    def _on_message(self, message):
+        if message.message_type != MessageType.SIGNAL:
+            return None
+        body = message.body
+        if message.sender == DBUS_SERVICE and message.member == "NameOwnerChanged":
+            name, _old_owner, new_owner = body
+            if name in self._owners:
+                self._owners[name] = new_owner or None
+
+        params = None
+        for subscription in self._subscriptions:
+            if subscription.interface != message.interface or subscription.signal != message.member:
+                continue
+            if subscription.arg0 is not None and (not body or body[0] != subscription.arg0):
+                continue
+            if message.sender not in (subscription.sender, self._owners.get(subscription.sender)):
+                continue
+            if params is None:
+                params = tuple(unpack_variants(body))
+            self._deliver(
+                subscription.callback, message.sender, message.path,
+                message.interface, message.member, params,
+            )
+        return None
+
+    def _deliver(self, callback, *args):
+        if self.deliver is not None:
+            self.deliver(callback, *args)
+            return
+        try:
+            callback(*args)
+        except Exception:
+            logger.exception(f"Error handling D-Bus signal {args[3]}")
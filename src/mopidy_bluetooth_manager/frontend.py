@@ -1,3 +1,5 @@
+import asyncio
+import json
 import logging
 import pykka
 import threading
@@ -8,6 +10,8 @@ import tornado.web
 import tornado.websocket
 
 from .bluez_dbus import BluetoothDbusController 
+from .metrics import rpc_errors, rpc_in_flight, rpc_request_seconds
+from .workers import DbusWorkerPool, QueueFullError
 
 import mopidy
 from mopidy.core.listener import CoreListener
@@ -17,45 +21,82 @@ from collections.abc import Awaitable
 
 logger = logging.getLogger(__name__)
 
+method_timeouts = {
+    "bluetooth.devices.connect": 30,
+    "bluetooth.devices.disconnect": 15,
+    "bluetooth.devices.remove": 15,
+}
+
+# How long on_start waits for the D-Bus subscriptions to be in place
+start_timeout = 30
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller(core: CoreProxy, config) -> BluetoothDbusController:
+    """Returns the controller shared by the frontend and the HTTP handlers"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = BluetoothDbusController(core, config)
+        return _controller
+
 
 class BluetoothManager(pykka.ThreadingActor, CoreListener):
     def __init__(self, config, core):
         super().__init__()
         self.config = config
         self.core = core
-        self.bluetooth_controller = BluetoothDbusController(core, config) #To be replaced with Python D-Bus Implementation in future.
+        self.bluetooth_controller = get_controller(core, config) #To be replaced with Python D-Bus Implementation in future.
 
 
     def on_event(self, event, **kwargs):
         """Handle Mopidy events"""
         if(event == 'options_changed'):
             print(f"Received event: {event} {kwargs}")
+        if(event == 'volume_changed'):
+            self.bluetooth_controller.volume.on_mixer_volume(kwargs['volume'])
 
 
     def on_start(self):
-        self.bluetooth_controller.adapter_set_name(self.config['bluetooth-manager']['name'])
-        threading.Thread(target=self.bluetooth_controller.start_dbus_listener(), daemon=True).start()
+        # Failures on the main loop thread only surface through the Future
+        try:
+            self.bluetooth_controller.start().result(timeout=start_timeout)
+        except Exception as e:
+            logger.error(f"Bluetooth Manager: Failed to start: {e!r}")
+            raise
         logger.info("Bluetooth Manager: Initialized")
 
 
-def make_jsonrpc_wrapper(core: CoreProxy, config) -> jsonrpc.Wrapper:
+    def on_stop(self):
+        self.bluetooth_controller.stop()
+
+
+def make_jsonrpc_wrapper(controller: BluetoothDbusController) -> jsonrpc.Wrapper:
     return jsonrpc.Wrapper(
         objects={
-            "bluetooth.adapter.discoverable": BluetoothDbusController(core, config).set_discoverable,
-            "bluetooth.adapter.discover": BluetoothDbusController(core, config).discover_devices,
-            "bluetooth.devices": BluetoothDbusController(core, config).get_devices,
-            "bluetooth.devices.info": BluetoothDbusController(core, config).get_device,
-            "bluetooth.devices.connect": BluetoothDbusController(core, config).device_connect,
-            "bluetooth.devices.disconnect": BluetoothDbusController(core, config).device_disconnect,
-            "bluetooth.devices.trust": BluetoothDbusController(core, config).device_trust,
-            "bluetooth.devices.remove": BluetoothDbusController(core, config).device_remove,
-            "bluetooth.player": BluetoothDbusController(core, config).get_player,
-            "bluetooth.player_pcm": BluetoothDbusController(core, config).get_audio_pcm_info,
-            "bluetooth.player.play": BluetoothDbusController(core, config).player_play,
-            "bluetooth.player.pause": BluetoothDbusController(core, config).player_pause,
-            "bluetooth.player.stop": BluetoothDbusController(core, config).player_stop,
-            "bluetooth.player.prev": BluetoothDbusController(core, config).player_prev,
-            "bluetooth.player.next": BluetoothDbusController(core, config).player_next,
+            "bluetooth.adapter.discoverable": controller.set_discoverable,
+            "bluetooth.adapter.discover": controller.discover_devices,
+            "bluetooth.adapter.discover.poll": controller.discover_poll,
+            "bluetooth.adapter.discover.stop": controller.discover_stop,
+            "bluetooth.devices": controller.get_devices,
+            "bluetooth.devices.info": controller.get_device,
+            "bluetooth.devices.connect": controller.device_connect,
+            "bluetooth.devices.disconnect": controller.device_disconnect,
+            "bluetooth.devices.trust": controller.device_trust,
+            "bluetooth.devices.remove": controller.device_remove,
+            "bluetooth.devices.prune": controller.prune_devices,
+            "bluetooth.devices.prune.status": controller.prune_status,
+            "bluetooth.devices.connections": controller.get_connection_states,
+            "bluetooth.player": controller.get_player,
+            "bluetooth.player_pcm": controller.get_audio_pcm_info,
+            "bluetooth.audio_sink": controller.get_audio_sink,
+            "bluetooth.player.play": controller.player_play,
+            "bluetooth.player.pause": controller.player_pause,
+            "bluetooth.player.stop": controller.player_stop,
+            "bluetooth.player.prev": controller.player_prev,
+            "bluetooth.player.next": controller.player_next,
         },
     )
 
@@ -66,13 +107,17 @@ class JsonRpcHandler(tornado.web.RequestHandler):
     def initialize(
             self,core: CoreProxy,
             config,
+            jsonrpc: jsonrpc.Wrapper,
+            workers: DbusWorkerPool,
             allowed_origins: set[str],
             csrf_protection: bool | None
             ) -> None:
         
         self.core = core
         self.config = config
-        self.jsonrpc = make_jsonrpc_wrapper(core, config)
+        self.jsonrpc = jsonrpc
+        self.workers = workers
+        self.timeout = config["bluetooth-manager"]["rpc_timeout"]
         self.allowed_origins = allowed_origins
         self.csrf_protection = csrf_protection
 
@@ -80,7 +125,7 @@ class JsonRpcHandler(tornado.web.RequestHandler):
         self.set_extra_headers()
         self.finish()
 
-    def post(self) -> Awaitable[None] | None:
+    async def post(self) -> None:
         if self.csrf_protection:
             content_type = (
                 self.request.headers.get("Content-Type", "").split(";")[0].strip()
@@ -101,9 +146,33 @@ class JsonRpcHandler(tornado.web.RequestHandler):
 
         logger.debug("Received RPC message from %s: %r", self.request.remote_ip, data)
 
+        request = tornado.escape.native_str(data)
+        method = self.method_label(request)
+        rpc_in_flight.inc()
+        try:
+            with rpc_request_seconds.time(method):
+                await self.handle_request(request, method)
+        finally:
+            rpc_in_flight.dec()
+
+    async def handle_request(self, request: str, method: str) -> None:
+        try:
+            future = self.workers.submit(self.jsonrpc.handle_json, request)
+        except QueueFullError as exc:
+            logger.warning("HTTP JSON-RPC request rejected: %s", exc)
+            rpc_errors.inc(method, "rejected")
+            self.set_status(503, "Too many pending Bluetooth requests")
+            return
+
         try:
             self.set_extra_headers()
-            response = self.jsonrpc.handle_json(tornado.escape.native_str(data))
+            try:
+                response = await asyncio.wait_for(
+                    asyncio.wrap_future(future), self.request_timeout(request)
+                )
+            except TimeoutError:
+                rpc_errors.inc(method, "timeout")
+                response = self.timeout_response(request)
             if response and self.write(response):
                 logger.debug(
                     "Sent RPC message to %s: %r",
@@ -112,8 +181,57 @@ class JsonRpcHandler(tornado.web.RequestHandler):
                 )
         except Exception as exc:  # noqa: BLE001
             logger.error("HTTP JSON-RPC request error: %s", exc)
+            rpc_errors.inc(method, "error")
             self.write_error(500)
 
+    def method_label(self, request: str) -> str:
+        """Method name used to label metrics, "batch" for batch requests"""
+        calls = self.parse_calls(request)
+        if request.lstrip().startswith("["):
+            return "batch"
+        if not calls:
+            return "invalid"
+        # Only registered methods, arbitrary client input would make the
+        # label set grow without bound
+        method = calls[0].get("method")
+        if isinstance(method, str) and method in self.jsonrpc.objects:
+            return method
+        return "unknown"
+
+    def request_timeout(self, request: str) -> float:
+        """Returns the longest timeout of the methods called in a request"""
+        timeout = self.timeout
+        for call in self.parse_calls(request):
+            timeout = max(timeout, method_timeouts.get(call.get("method"), 0))
+        return timeout
+
+    def timeout_response(self, request: str) -> str | None:
+        errors = [
+            {
+                "jsonrpc": "2.0",
+                "id": call["id"],
+                "error": {"code": -32000, "message": "Bluetooth request timed out"},
+            }
+            for call in self.parse_calls(request)
+            if call.get("id") is not None
+        ]
+        if not errors:
+            return None
+        if request.lstrip().startswith("["):
+            return json.dumps(errors)
+        return json.dumps(errors[0])
+
+    def parse_calls(self, request: str) -> list[dict]:
+        try:
+            calls = json.loads(request)
+        except ValueError:
+            return []
+        if isinstance(calls, dict):
+            calls = [calls]
+        if not isinstance(calls, list):
+            return []
+        return [call for call in calls if isinstance(call, dict)]
+
     def set_mopidy_headers(self) -> None:
         self.set_header("Cache-Control", "no-cache")
         self.set_header("X-Mopidy-Version", mopidy.__version__.encode())
@@ -0,0 +1,86 @@
+import logging
+import threading
+
+from concurrent.futures import Future
+
+from gi.repository import GLib
+
+logger = logging.getLogger(__name__)
+
+
+class BluetoothMainLoop():
+    """GLib main loop on its own thread and main context.
+
+    Signal subscriptions, exported objects and GStreamer bus watches are
+    dispatched on the main context that was the thread default when they
+    were set up. Setting them up through call() ties all of that to this
+    thread, independent of whatever else runs on Mopidy's default context.
+    """
+
+    def __init__(self, name="BluetoothMainLoop"):
+        self.name = name
+        self._context = GLib.MainContext.new()
+        self._loop = GLib.MainLoop.new(self._context, False)
+        self._thread = None
+        self._started = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.call_soon(self._loop.quit)
+        self._thread.join(timeout=5)
+        self._thread = None
+        self._started.clear()
+
+    def in_loop(self):
+        return threading.current_thread() is self._thread
+
+    def call_soon(self, fn, *args):
+        """Runs fn(*args) on the loop thread, from any thread"""
+        def callback(*_):
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception(f"Error in {self.name} callback")
+            return GLib.SOURCE_REMOVE
+
+        source = GLib.idle_source_new()
+        source.set_callback(callback)
+        source.attach(self._context)
+
+    def call(self, fn, *args):
+        """Runs fn(*args) on the loop thread and returns a Future of its result"""
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        if self.in_loop():
+            run()
+        else:
+            self.call_soon(run)
+        return future
+
+    def _run(self):
+        self._context.push_thread_default()
+        try:
+            self._started.set()
+            self._loop.run()
+        finally:
+            self._context.pop_thread_default()
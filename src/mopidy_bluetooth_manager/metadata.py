@@ -0,0 +1,128 @@
+import collections
+import logging
+import threading
+
+from mopidy.models import Album, Artist, Track, TlTrack
+
+logger = logging.getLogger(__name__)
+
+track_fields = ("Title", "Artist", "Album", "TrackNumber", "Duration")
+
+
+class ModelCache():
+    """Bounded LRU cache interning immutable Mopidy models by name"""
+
+    def __init__(self, model, max_size=128):
+        self.model = model
+        self.max_size = max_size
+        self._models = collections.OrderedDict()
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is None:
+            model = self.model(name=name)
+            self._models[name] = model
+            if len(self._models) > self.max_size:
+                self._models.popitem(last=False)
+        else:
+            self._models.move_to_end(name)
+        return model
+
+
+class TrackMetadataStage():
+    """Turns MediaPlayer1 Track updates into one Mopidy track change each.
+
+    Phones often send a track change as several partial Track updates a few
+    milliseconds apart. Updates arriving within delay seconds are merged,
+    and a result identical to the current track is dropped, so publish is
+    only called once per real track change. The debounced flush is handed
+    to schedule(fn), e.g. the event dispatcher, so it runs in order with
+    the other Mopidy-bound events.
+    """
+
+    def __init__(self, publish, delay=0.05, cache_size=128, schedule=None):
+        self.publish = publish
+        self.delay = delay
+        self.schedule = schedule
+        self.current = None
+        self._current_key = None
+        self._artists = ModelCache(Artist, cache_size)
+        self._albums = ModelCache(Album, cache_size)
+        self._lock = threading.Lock()
+        # Held while publishing, so reset waits for a publish in progress
+        self._publish_lock = threading.Lock()
+        self._generation = 0
+        self._pending = None
+        self._timer = None
+
+    def submit(self, track):
+        """Queues a possibly partial Track update"""
+        with self._lock:
+            self._pending = {**(self._pending or {}), **track}
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.delay, self._flush_later)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def set(self, track):
+        """Publishes a track right away, dropping queued updates"""
+        with self._lock:
+            self._cancel()
+            self._pending = dict(track)
+        self.flush()
+
+    def reset(self):
+        """Forgets the current track, e.g. after the device disconnected
+
+        A track taken by a flush before the reset is not published after it.
+        """
+        with self._publish_lock, self._lock:
+            self._cancel()
+            self._generation += 1
+            self._pending = None
+            self.current = None
+            self._current_key = None
+
+    def flush(self):
+        with self._lock:
+            self._timer = None
+            track, self._pending = self._pending, None
+            if track is None:
+                return
+            key = tuple(track.get(field) for field in track_fields)
+            if key == self._current_key:
+                return
+            previous = self.current
+            self.current = TlTrack(1, track=self._build(track))
+            self._current_key = key
+            tl_track = self.current
+            generation = self._generation
+
+        with self._publish_lock:
+            if generation != self._generation:
+                return
+            try:
+                self.publish(previous, tl_track)
+            except Exception:
+                logger.exception("Failed to publish Bluetooth track metadata")
+
+    def _flush_later(self):
+        if self.schedule is None:
+            self.flush()
+        else:
+            self.schedule(self.flush)
+
+    def _cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _build(self, track):
+        return Track(
+            name = track.get("Title") if track.get("Title") else 'Bluetooth',
+            artists = frozenset([self._artists.get(track.get("Artist") or "Unknown")]),
+            album = self._albums.get(track["Album"]) if track.get("Album") else None,
+            track_no = int(track["TrackNumber"]) if track.get("TrackNumber") is not None else None,
+            length = int(track["Duration"]) if track.get("Duration") is not None else None,
+        )
@@ -0,0 +1,233 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+
+import tornado.web
+
+logger = logging.getLogger(__name__)
+
+# Seconds, from a cached property read up to a slow Connect
+default_buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric():
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._function = None
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, function):
+        """Reads the unlabelled value from function at scrape time"""
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception:
+                logger.exception(f"Failed to read metric {self.name}")
+        return super().render()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=default_buckets):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._values.get(labels)
+            if sample is None:
+                sample = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            sample[0][index] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    def time(self, *labels, errors=None):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels, errors)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _Timer():
+    def __init__(self, histogram, labels, errors):
+        self.histogram = histogram
+        self.labels = labels
+        self.errors = errors
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        if exc_type is not None and self.errors is not None:
+            self.errors.inc(*self.labels)
+        return False
+
+
+class MetricsRegistry():
+    """Process wide metrics, rendered in the Prometheus text format on scrape"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=default_buckets):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+dbus_call_seconds = registry.histogram(
+    "bluetooth_dbus_call_seconds", "Duration of BlueZ D-Bus calls made by the controller", ["call"]
+)
+dbus_call_errors = registry.counter(
+    "bluetooth_dbus_call_errors_total", "BlueZ D-Bus calls that raised", ["call"]
+)
+signals_received = registry.counter(
+    "bluetooth_signals_total", "PropertiesChanged properties received", ["interface", "property"]
+)
+signal_handler_seconds = registry.histogram(
+    "bluetooth_signal_handler_seconds",
+    "Time spent handling one PropertiesChanged signal",
+    ["interface"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1),
+)
+signal_handler_errors = registry.counter(
+    "bluetooth_signal_handler_errors_total", "PropertiesChanged handlers that raised", ["interface"]
+)
+rpc_request_seconds = registry.histogram(
+    "bluetooth_rpc_request_seconds", "Duration of HTTP JSON-RPC requests", ["method"]
+)
+rpc_errors = registry.counter(
+    "bluetooth_rpc_errors_total", "HTTP JSON-RPC requests that failed", ["method", "reason"]
+)
+rpc_in_flight = registry.gauge(
+    "bluetooth_rpc_in_flight", "HTTP JSON-RPC requests currently being handled"
+)
+rpc_in_flight.set(0)
+rpc_queue_pending = registry.gauge(
+    "bluetooth_rpc_queue_pending", "Blocking Bluetooth calls queued or running in the worker pool"
+)
+
+
+def timed_dbus_call(name):
+    """Decorator recording a controller method as a D-Bus call"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with dbus_call_seconds.time(name, errors=dbus_call_errors):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def initialize(self, registry: MetricsRegistry = registry) -> None:
+        self.registry = registry
+
+    def get(self) -> None:
+        self.set_header("Content-Type", content_type)
+        self.set_header("Cache-Control", "no-cache")
+        self.write(self.registry.render())
@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+
+from .bluez_objects import PLAYER_IFACE
+
+logger = logging.getLogger(__name__)
+
+# Position reports closer than this to the extrapolated position are
+# corrections of the clock, e.g. on pause and resume, not seeks
+seek_tolerance_ms = 1500
+
+
+class PositionClock():
+    """Estimates a player's position from its last known position.
+
+    MediaPlayer1 only signals Position on seeks and status changes, in
+    between the position is extrapolated from a monotonic clock.
+    """
+
+    def __init__(self, position=0, status=None, duration=None):
+        self.anchor(position, status, duration)
+
+    def anchor(self, position, status, duration):
+        self.position_ms = position or 0
+        self.anchored_at = time.monotonic()
+        self.status = status
+        self.duration = duration
+
+    def position(self, now=None):
+        position = self.position_ms
+        if self.status == "playing":
+            now = time.monotonic() if now is None else now
+            position += int((now - self.anchored_at) * 1000)
+        if self.duration:
+            position = min(position, self.duration)
+        return position
+
+
+class PlayerClocks():
+    """Position clocks for every MediaPlayer1, re-anchored from object tree updates.
+
+    A Position update that jumps away from the extrapolated position of the
+    same track is remembered as a seek until take_seek picks it up. Clocks
+    are created when a player appears, so seeks are seen without anyone
+    polling position first.
+    """
+
+    def __init__(self, object_tree=None):
+        self.object_tree = object_tree
+        self._lock = threading.Lock()
+        self._clocks = {}
+        self._seeks = {}
+
+    def position(self, path, props):
+        """Returns the estimated position of the player at path in milliseconds"""
+        with self._lock:
+            clock = self._clocks.get(path)
+            if clock is None:
+                clock = self._clocks[path] = _clock(props)
+            return clock.position()
+
+    def take_seek(self, path):
+        """Returns and clears the position of a seek seen on path, or None"""
+        with self._lock:
+            return self._seeks.pop(path, None)
+
+    def on_object_event(self, event, path, interface, changed):
+        if interface != PLAYER_IFACE:
+            return
+        with self._lock:
+            if event == "removed":
+                self._clocks.pop(path, None)
+                self._seeks.pop(path, None)
+                return
+            clock = self._clocks.get(path)
+            if event == "added":
+                self._clocks[path] = _clock(changed)
+                return
+            if clock is None:
+                # A player from the initial seed, anchor on its first update
+                props = self.object_tree.get(path, interface) if self.object_tree else None
+                self._clocks[path] = _clock(props if props is not None else changed)
+                return
+            if "Position" in changed:
+                position = changed["Position"]
+                if "Track" not in changed and abs(position - clock.position()) > seek_tolerance_ms:
+                    self._seeks[path] = position
+            elif "Track" in changed:
+                position = 0
+            else:
+                position = clock.position()
+            duration = _duration(changed["Track"]) if "Track" in changed else clock.duration
+            clock.anchor(position, changed.get("Status", clock.status), duration)
+
+
+def _clock(props):
+    return PositionClock(props.get("Position"), props.get("Status"), _duration(props.get("Track")))
+
+
+def _duration(track):
+    if track and track.get("Duration") is not None:
+        return int(track["Duration"])
+    return None
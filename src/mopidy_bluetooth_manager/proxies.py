@@ -0,0 +1,49 @@
+import collections
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ProxyCache():
+    """Bounded LRU cache of pydbus proxies keyed by object path.
+
+    bus.get introspects the remote object and generates a proxy class on
+    every call, so proxies are reused until the object changes shape
+    (InterfacesAdded/InterfacesRemoved) or the service owner changes.
+    """
+
+    def __init__(self, get_bus, service, max_size=64):
+        self.get_bus = get_bus
+        self.service = service
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._proxies = collections.OrderedDict()
+
+    def get(self, path):
+        with self._lock:
+            proxy = self._proxies.get(path)
+            if proxy is not None:
+                self._proxies.move_to_end(path)
+                return proxy
+
+        proxy = self.get_bus().get(self.service, path)
+
+        with self._lock:
+            self._proxies[path] = proxy
+            self._proxies.move_to_end(path)
+            while len(self._proxies) > self.max_size:
+                self._proxies.popitem(last=False)
+        return proxy
+
+    def evict(self, path):
+        with self._lock:
+            self._proxies.pop(path, None)
+
+    def clear(self):
+        with self._lock:
+            self._proxies.clear()
+
+    def on_object_event(self, event, path, interface, changed):
+        if event != "changed":
+            self.evict(path)
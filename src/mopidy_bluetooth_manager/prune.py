@@ -0,0 +1,196 @@
+import collections
+import logging
+import threading
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+max_finished_jobs = 8
+
+
+class PruneJob():
+    """Progress of one bulk removal"""
+
+    def __init__(self, device_paths):
+        self.id = uuid.uuid4().hex
+        self.device_paths = list(device_paths)
+        self.removed = []
+        self.failed = []
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def done(self):
+        return len(self.removed) + len(self.failed) >= len(self.device_paths)
+
+    def as_dict(self):
+        end = self.finished or time.monotonic()
+        return {
+            "job_id": self.id,
+            "total": len(self.device_paths),
+            "removed": list(self.removed),
+            "failed": list(self.failed),
+            "done": self.done,
+            "seconds": round(end - self.started, 3),
+        }
+
+
+class DevicePruner():
+    """Removes stale devices from BlueZ in bulk.
+
+    Devices are ranked by when they were last used: last connected, or
+    first recorded by the device registry if they never connected.
+    Unpaired devices are discovery leftovers and rank oldest. Paired
+    devices the registry has no history for are never removed, their age
+    is unknown. A device is stale when it is not connected and either was
+    last used more than max_age seconds ago or falls outside the
+    max_devices most recently used. BlueZ trusts every device it pairs or
+    connects, so keep_trusted, which spares trusted devices, is off by
+    default. Removals run concurrently, progress goes to listeners and can
+    be polled by job id.
+    """
+
+    def __init__(self, object_tree, history, remove, max_workers=4):
+        self.object_tree = object_tree
+        self.history = history
+        self.remove = remove
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="BluetoothPrune")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._finished = collections.deque()
+        self._listeners = []
+        self._policy = None
+        self._timer = None
+
+    def add_listener(self, listener):
+        """Registers listener(job_dict), called after every removal"""
+        with self._lock:
+            self._listeners = [*self._listeners, listener]
+
+    def candidates(self, max_devices=None, max_age=None, keep_trusted=False, now=None):
+        """Device paths to remove under the given policy, oldest first"""
+        now = now or time.time()
+        devices = []
+        for path, device in self.object_tree.devices():
+            if device.get("Connected"):
+                continue
+            if not device.get("Paired"):
+                last_used = 0
+            else:
+                remembered = self.history.get(device.get("Address")) if self.history else None
+                remembered = remembered or {}
+                last_used = remembered.get("last_connected") or remembered.get("first_seen")
+                if not last_used:
+                    continue
+            devices.append((last_used, path, device))
+        devices.sort(key=lambda item: item[0], reverse=True)
+
+        stale = []
+        for index, (last_used, path, device) in enumerate(devices):
+            if keep_trusted and device.get("Trusted"):
+                continue
+            too_many = max_devices is not None and index >= max_devices
+            too_old = max_age is not None and now - last_used > max_age
+            if too_many or too_old:
+                stale.append(path)
+        stale.reverse()
+        return stale
+
+    def prune(self, max_devices=None, max_age=None, keep_trusted=False, device_paths=None):
+        """Starts removing devices and returns the job right away"""
+        if device_paths is None:
+            device_paths = self.candidates(max_devices, max_age, keep_trusted)
+        job = PruneJob(device_paths)
+        with self._lock:
+            self._jobs[job.id] = job
+        if device_paths:
+            logger.info(f"Pruning {len(device_paths)} Bluetooth devices")
+        for path in device_paths:
+            self._executor.submit(self._remove, job, path)
+        if not device_paths:
+            self._finish(job)
+        return job.as_dict()
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise RuntimeError(f"Unknown prune job {job_id}")
+        return job.as_dict()
+
+    def start_policy(self, interval, **policy):
+        """Prunes every interval seconds in the background"""
+        with self._lock:
+            self._policy = (interval, policy)
+        self._schedule()
+
+    def stop(self):
+        """Stops the policy and cancels queued removals, for shutdown"""
+        self.stop_policy()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop_policy(self):
+        with self._lock:
+            self._policy = None
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+
+    def _schedule(self):
+        with self._lock:
+            if self._policy is None:
+                return
+            timer = threading.Timer(self._policy[0], self._run_policy)
+            timer.daemon = True
+            self._timer = timer
+        timer.start()
+
+    def _run_policy(self):
+        with self._lock:
+            policy = self._policy
+        if policy is None:
+            return
+        try:
+            self.prune(**policy[1])
+        except Exception:
+            logger.exception("Background Bluetooth device pruning failed")
+        self._schedule()
+
+    def _remove(self, job, path):
+        try:
+            self.remove(path)
+            outcome = job.removed
+        except Exception as e:
+            logger.debug(f"Failed to prune {path}: {e}")
+            outcome = job.failed
+        with self._lock:
+            outcome.append(path)
+            done = job.done
+        if done:
+            self._finish(job)
+        else:
+            self._notify(job)
+
+    def _finish(self, job):
+        with self._lock:
+            job.finished = time.monotonic()
+            self._finished.append(job.id)
+            while len(self._finished) > max_finished_jobs:
+                self._jobs.pop(self._finished.popleft(), None)
+        logger.info(
+            f"Pruned {len(job.removed)} Bluetooth devices, {len(job.failed)} failed"
+        )
+        self._notify(job)
+
+    def _notify(self, job):
+        with self._lock:
+            state = job.as_dict()
+            listeners = self._listeners
+        for listener in listeners:
+            try:
+                listener(state)
+            except Exception:
+                logger.exception("Bluetooth prune progress listener failed")
@@ -0,0 +1,178 @@
+import collections
+import json
+import logging
+import threading
+
+import tornado.ioloop
+import tornado.websocket
+
+from mopidy.http.handlers import check_origin
+
+from .bluez_objects import (
+    ADAPTER_IFACE,
+    DEVICE_IFACE,
+    PLAYER_IFACE,
+    TRANSPORT_IFACE,
+)
+
+logger = logging.getLogger(__name__)
+
+delta_types = {
+    ADAPTER_IFACE: "adapter",
+    DEVICE_IFACE: "device",
+    PLAYER_IFACE: "player",
+    TRANSPORT_IFACE: "transport",
+}
+
+
+def _json_default(value):
+    if isinstance(value, bytes | bytearray):
+        return list(value)
+    return str(value)
+
+
+class DeltaBroadcaster():
+    """Pushes typed Bluetooth state deltas to WebSocket clients.
+
+    Updates arriving within window seconds of each other are merged per
+    object, so a burst of PropertiesChanged signals goes out as one message
+    per changed object.
+    """
+
+    def __init__(self, object_tree, window=0.05):
+        self.object_tree = object_tree
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._clients = set()
+        self._io_loop = None
+        self._flush_scheduled = False
+
+    def add_client(self, client):
+        if self._io_loop is None:
+            self._io_loop = tornado.ioloop.IOLoop.current()
+        with self._lock:
+            first = not self._clients
+            self._clients.add(client)
+        if first:
+            self.object_tree.add_listener(self.on_object_event)
+
+    def remove_client(self, client):
+        with self._lock:
+            self._clients.discard(client)
+            last = not self._clients
+        if last:
+            self.object_tree.remove_listener(self.on_object_event)
+
+    def snapshot(self):
+        """Returns the current state as deltas, sent to clients on connect"""
+        deltas = []
+        for interface, delta_type in delta_types.items():
+            for path, props in self.object_tree.find(interface):
+                if interface == DEVICE_IFACE and not props.get("Connected"):
+                    continue
+                deltas.append(
+                    {"type": delta_type, "path": path, "event": "added", "properties": props}
+                )
+        return deltas
+
+    def on_object_event(self, event, path, interface, changed):
+        delta_type = delta_types.get(interface)
+        if delta_type is None:
+            return
+        self.publish(delta_type, path, event, changed)
+
+    def publish(self, delta_type, path, event, properties):
+        """Queues a delta, safe to call from any thread"""
+        if self._io_loop is None:
+            return
+        with self._lock:
+            if not self._clients:
+                return
+            key = (delta_type, path)
+            delta = self._pending.get(key)
+            if delta is None or event != "changed":
+                previous = delta["properties"] if delta and event != "removed" else {}
+                self._pending[key] = {
+                    "type": delta_type,
+                    "path": path,
+                    "event": event,
+                    "properties": {**previous, **properties},
+                }
+            else:
+                delta["properties"].update(properties)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self._io_loop.add_callback(self._io_loop.call_later, self.window, self._flush)
+
+    def _flush(self):
+        with self._lock:
+            deltas = list(self._pending.values())
+            self._pending.clear()
+            self._flush_scheduled = False
+            clients = list(self._clients)
+        messages = [json.dumps(delta, default=_json_default) for delta in deltas]
+        for client in clients:
+            client.enqueue(messages)
+
+
+class PushHandler(tornado.websocket.WebSocketHandler):
+    def initialize(
+            self,
+            broadcaster: DeltaBroadcaster,
+            allowed_origins: set[str],
+            csrf_protection: bool | None,
+            max_buffer: int = 256,
+            ) -> None:
+        self.broadcaster = broadcaster
+        self.allowed_origins = allowed_origins
+        self.csrf_protection = csrf_protection
+        self.buffer = collections.deque()
+        self.max_buffer = max_buffer
+        self.sending = False
+
+    def open(self, *args, **kwargs) -> None:
+        logger.debug("Bluetooth push client connected: %s", self.request.remote_ip)
+        self.set_nodelay(True)
+        self.broadcaster.add_client(self)
+        self.enqueue(
+            [json.dumps(delta, default=_json_default) for delta in self.broadcaster.snapshot()]
+        )
+
+    def on_close(self) -> None:
+        logger.debug("Bluetooth push client disconnected: %s", self.request.remote_ip)
+        self.broadcaster.remove_client(self)
+
+    def on_message(self, message) -> None:
+        pass
+
+    def check_origin(self, origin: str) -> bool:
+        if not self.csrf_protection:
+            return True
+        return check_origin(origin, self.request.headers, self.allowed_origins)
+
+    def enqueue(self, messages) -> None:
+        """Buffers messages for this client.
+
+        When a slow client falls more than max_buffer messages behind, its
+        backlog is dropped and replaced by a resync marker telling it to
+        refetch state over /rpc.
+        """
+        if len(self.buffer) + len(messages) > self.max_buffer:
+            self.buffer.clear()
+            self.buffer.append(json.dumps({"type": "resync"}))
+            messages = messages[1 - self.max_buffer:]
+        self.buffer.extend(messages)
+        if not self.sending:
+            self.sending = True
+            tornado.ioloop.IOLoop.current().spawn_callback(self._drain)
+
+    async def _drain(self) -> None:
+        try:
+            while self.buffer:
+                await self.write_message(self.buffer.popleft())
+        except tornado.websocket.WebSocketClosedError:
+            self.buffer.clear()
+        finally:
+            self.sending = False
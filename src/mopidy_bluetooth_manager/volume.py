@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+
+from .bluez_objects import DEVICE_IFACE, TRANSPORT_IFACE
+
+logger = logging.getLogger(__name__)
+
+# AVRCP absolute volume range of MediaTransport1.Volume
+transport_max = 127
+
+# How long a value we wrote is expected to come back as an echo
+echo_window = 1.0
+
+
+def to_mixer(volume):
+    return max(0, min(100, round(volume * 100 / transport_max)))
+
+
+def to_transport(volume):
+    return max(0, min(transport_max, round(volume * transport_max / 100)))
+
+
+class VolumeSync():
+    """Two-way sync between MediaTransport1.Volume and the Mopidy mixer.
+
+    Each side remembers the value it last pushed to the other, and the echo
+    of that value coming back is dropped so the two never ping-pong. Mixer
+    changes are written to the transports at most max_rate times a second,
+    a slider drag in between collapses into its latest value. The initial
+    volume is applied once per new connection, when a device's Connected
+    goes from false to true, never on startup or after bluetoothd restarts.
+    """
+
+    def __init__(self, core, object_tree, backend, initial_volume=None, max_rate=10):
+        self.core = core
+        self.object_tree = object_tree
+        self.backend = backend
+        self.initial_volume = initial_volume
+        self.interval = 1 / max_rate
+        self._lock = threading.Lock()
+        self._transport_echo = {}
+        self._mixer_echo = None
+        self._pending = None
+        self._timer = None
+        self._last_write = 0.0
+        # Devices that just connected and still wait for the initial volume
+        self._connecting = set()
+
+    def on_transport_volume(self, path, value):
+        """Volume changed on the phone (or is the echo of our own write)"""
+        now = time.monotonic()
+        with self._lock:
+            echo = self._transport_echo.pop(path, None)
+            if echo is not None and echo[0] == value and now < echo[1]:
+                return
+        self._set_mixer(to_mixer(value))
+
+    def on_mixer_volume(self, volume):
+        """Volume changed in Mopidy (or is the echo of a phone change)"""
+        now = time.monotonic()
+        with self._lock:
+            echo, self._mixer_echo = self._mixer_echo, None
+            if echo is not None and echo[0] == volume and now < echo[1]:
+                return
+        self.set_volume(volume)
+
+    def set_volume(self, volume):
+        """Queues a write of a 0-100 volume to the active transports"""
+        with self._lock:
+            self._pending = to_transport(volume)
+            if self._timer is not None:
+                return
+            delay = max(0.0, self._last_write + self.interval - time.monotonic())
+            self._timer = threading.Timer(delay, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def on_object_event(self, event, path, interface, changed):
+        if interface == DEVICE_IFACE:
+            self._on_device_event(event, path, changed)
+            return
+        if interface != TRANSPORT_IFACE:
+            return
+        if event == "removed":
+            with self._lock:
+                self._transport_echo.pop(path, None)
+        elif event == "added" and "Volume" in changed:
+            self._apply_initial_volume(changed.get("Device"))
+
+    def _on_device_event(self, event, path, changed):
+        if self.initial_volume is None:
+            return
+        if event == "removed" or changed.get("Connected") is False:
+            with self._lock:
+                self._connecting.discard(path)
+        elif event == "changed" and changed.get("Connected"):
+            with self._lock:
+                self._connecting.add(path)
+            # The transport can show up before or after Connected flips
+            _, transport = self.object_tree.transport_for(path)
+            if transport is not None and "Volume" in transport:
+                self._apply_initial_volume(path)
+
+    def _apply_initial_volume(self, device_path):
+        with self._lock:
+            if device_path not in self._connecting:
+                return
+            self._connecting.discard(device_path)
+        logger.info(f"Applying initial Bluetooth volume {self.initial_volume}")
+        self._set_mixer(self.initial_volume)
+        self.set_volume(self.initial_volume)
+
+    def _flush(self):
+        with self._lock:
+            value, self._pending = self._pending, None
+            self._timer = None
+            self._last_write = time.monotonic()
+        if value is None:
+            return
+
+        for path, transport in self.object_tree.find(TRANSPORT_IFACE):
+            if "Volume" not in transport or transport["Volume"] == value:
+                continue
+            with self._lock:
+                self._transport_echo[path] = (value, time.monotonic() + echo_window)
+            try:
+                self.backend.set_property(path, TRANSPORT_IFACE, "Volume", value)
+            except Exception as e:
+                with self._lock:
+                    self._transport_echo.pop(path, None)
+                logger.warning(f"Failed to set Bluetooth volume on {path}: {e}")
+
+    def _set_mixer(self, volume):
+        with self._lock:
+            self._mixer_echo = (volume, time.monotonic() + echo_window)
+        try:
+            self.core.mixer.set_volume(volume)
+        except Exception as e:
+            logger.warning(f"Failed to set mixer volume: {e}")
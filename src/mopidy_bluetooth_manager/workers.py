@@ -0,0 +1,50 @@
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class DbusWorkerPool():
+    """Bounded thread pool that runs blocking BlueZ calls off the IOLoop.
+
+    At most max_pending calls may be queued or running at once, further
+    submissions are rejected with QueueFullError instead of piling up.
+    """
+
+    def __init__(self, max_workers=4, max_pending=32):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="BluetoothDbus"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"{self._pending} Bluetooth calls already pending")
+            self._pending += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
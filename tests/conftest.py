@@ -0,0 +1,82 @@
+import shutil
+import subprocess
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def bus_address():
+    """A private dbus-daemon, torn down after the test"""
+    if shutil.which("dbus-daemon") is None:
+        pytest.skip("dbus-daemon not installed")
+    daemon = subprocess.Popen(
+        ["dbus-daemon", "--session", "--nofork", "--print-address=1"],
+        stdout=subprocess.PIPE, text=True,
+    )
+    address = daemon.stdout.readline().strip()
+    yield address
+    daemon.terminate()
+    daemon.wait(timeout=5)
+
+
+@pytest.fixture
+def fake_bluez(bus_address):
+    from fake_bluez import FakeBluez
+
+    service = FakeBluez(bus_address, devices=2, discovery_devices=0)
+    service.start()
+    yield service
+    service.stop()
+
+
+class Signals():
+    """Collects signal callbacks and waits for them"""
+
+    def __init__(self):
+        self.received = []
+        self._condition = threading.Condition()
+
+    def __call__(self, *args):
+        with self._condition:
+            self.received.append(args)
+            self._condition.notify_all()
+
+    def wait(self, count=1, timeout=5):
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.received) >= count, timeout=timeout)
+            return list(self.received)
+
+
+@pytest.fixture
+def signals():
+    return Signals()
+
+
+@pytest.fixture
+def mainloop():
+    """The Bluetooth main loop, subscribe through it as the controller does"""
+    from mopidy_bluetooth_manager.mainloop import BluetoothMainLoop
+
+    loop = BluetoothMainLoop()
+    loop.start()
+    yield loop
+    loop.stop()
+
+
+@pytest.fixture(params=["pydbus", "dbus-fast"])
+def backend(request, bus_address, fake_bluez, mainloop):
+    """Both backends against the same fake service"""
+    if request.param == "pydbus":
+        pydbus = pytest.importorskip("pydbus")
+        from mopidy_bluetooth_manager.backend import PydbusBackend
+
+        bus = pydbus.connect(bus_address)
+        backend = PydbusBackend(lambda: bus)
+    else:
+        from mopidy_bluetooth_manager.fast_backend import DbusFastBackend
+
+        backend = DbusFastBackend(deliver=mainloop.call_soon, bus_address=bus_address)
+    backend.start()
+    yield backend
+    backend.stop()
@@ -0,0 +1,100 @@
+import pytest
+
+pytest.importorskip("mopidy")
+
+from mopidy_bluetooth_manager.a2dp import (
+    CODEC_AAC,
+    CODEC_SBC,
+    CODEC_VENDOR,
+    CodecConfigCache,
+    decode_a2dp_config,
+)
+
+SBC_44100_JOINT_STEREO = [0x21, 0x15, 2, 53]
+AAC_44100_VBR_320K = [0x80, 0x01, 0x04, 0x84, 0xE2, 0x00]
+AAC_48000_320K = [0x40, 0x00, 0x84, 0x04, 0xE2, 0x00]
+APTX_44100_STEREO = [0x4F, 0x00, 0x00, 0x00, 0x01, 0x00, 0x22]
+LDAC_48000_STEREO = [0x2D, 0x01, 0x00, 0x00, 0xAA, 0x00, 0x10, 0x01]
+
+
+def test_sbc():
+    config = decode_a2dp_config(CODEC_SBC, SBC_44100_JOINT_STEREO)
+
+    assert config["codec"] == "SBC"
+    assert config["rate"] == 44100
+    assert config["channel_mode"] == "Joint Stereo"
+    assert config["channels"] == 2
+    assert config["block_length"] == 16
+    assert config["subbands"] == 8
+    assert config["allocation"] == "Loudness"
+    assert (config["min_bitpool"], config["max_bitpool"]) == (2, 53)
+    # 119 byte frames of 128 samples
+    assert config["bitrate"] == 327993
+    assert round(config["bitrate"] / 1000) == 328
+    assert config["frame_duration_ms"] == pytest.approx(2.902, abs=0.001)
+
+
+@pytest.mark.parametrize(("config", "expected"), [
+    (AAC_44100_VBR_320K, {
+        "rate": 44100, "channels": 2, "object_type": "MPEG-2 AAC LC",
+        "vbr": True, "bitrate": 320000,
+    }),
+    (AAC_48000_320K, {
+        "rate": 48000, "channels": 2, "object_type": "MPEG-4 AAC LC",
+        "vbr": False, "bitrate": 320000,
+    }),
+])
+def test_aac(config, expected):
+    decoded = decode_a2dp_config(CODEC_AAC, config)
+
+    assert decoded["codec"] == "AAC"
+    assert {key: decoded[key] for key in expected} == expected
+    assert decoded["frame_duration_ms"] == pytest.approx(1000 * 1024 / expected["rate"])
+
+
+def test_aptx():
+    config = decode_a2dp_config(CODEC_VENDOR, APTX_44100_STEREO)
+
+    assert config["codec"] == "aptX"
+    assert config["rate"] == 44100
+    assert config["channel_mode"] == "Stereo"
+    assert config["bitrate"] == 44100 * 2 * 4
+    assert (config["vendor_id"], config["vendor_codec_id"]) == (0x4F, 0x0001)
+
+
+def test_ldac():
+    config = decode_a2dp_config(CODEC_VENDOR, LDAC_48000_STEREO)
+
+    assert config["codec"] == "LDAC"
+    assert config["rate"] == 48000
+    assert config["channel_mode"] == "Stereo"
+    assert config["channels"] == 2
+
+
+def test_unknown_vendor_codec_keeps_its_ids():
+    config = decode_a2dp_config(CODEC_VENDOR, [0x34, 0x12, 0x00, 0x00, 0x78, 0x56])
+
+    assert config["codec"] == "Vendor 0x00001234:0x5678"
+    assert config["rate"] is None
+
+
+@pytest.mark.parametrize(("codec", "config"), [
+    (CODEC_VENDOR, [0x4F, 0x00, 0x00]),
+    (CODEC_VENDOR, APTX_44100_STEREO[:6]),
+    (CODEC_SBC, [0x21]),
+    (CODEC_AAC, None),
+])
+def test_truncated_configurations_are_invalid(codec, config):
+    assert decode_a2dp_config(codec, config)["codec"] == f"Invalid ({codec})"
+
+
+def test_unknown_codec():
+    assert decode_a2dp_config(0x05, [])["codec"] == "Unknown (5)"
+
+
+def test_cache_decodes_again_when_the_configuration_changes():
+    cache = CodecConfigCache()
+    path = "/org/bluez/hci0/dev_AA_BB_CC_DD_EE_FF/fd0"
+
+    assert cache.decode(path, CODEC_SBC, SBC_44100_JOINT_STEREO)["codec"] == "SBC"
+    assert cache.decode(path, CODEC_AAC, AAC_48000_320K)["rate"] == 48000
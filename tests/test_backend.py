@@ -0,0 +1,169 @@
+import pytest
+
+pytest.importorskip("mopidy")
+pytest.importorskip("dbus_fast")
+
+from fake_bluez import FakeBluez, adapter_path
+
+from mopidy_bluetooth_manager.backend import BluezBackend
+from mopidy_bluetooth_manager.bluez_objects import (
+    ADAPTER_IFACE,
+    DEVICE_IFACE,
+    PLAYER_IFACE,
+    TRANSPORT_IFACE,
+)
+
+# The fake service connects its first device and leaves the second idle
+CONNECTED_PATH = f"{adapter_path}/dev_02_00_00_00_00_00"
+DEVICE_PATH = f"{adapter_path}/dev_02_00_00_00_00_01"
+PLAYER_PATH = f"{CONNECTED_PATH}/player0"
+TRANSPORT_PATH = f"{CONNECTED_PATH}/fd0"
+
+PROPERTIES_CHANGED = ("org.freedesktop.DBus.Properties", "PropertiesChanged")
+OBJECT_MANAGER = "org.freedesktop.DBus.ObjectManager"
+
+
+def subscribe(mainloop, backend, *args, **kwargs):
+    return mainloop.call(lambda: backend.subscribe(*args, **kwargs)).result(timeout=5)
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        BluezBackend()
+
+
+def test_get_managed_objects_returns_plain_values(backend):
+    objects = backend.get_managed_objects()
+
+    assert objects[adapter_path][ADAPTER_IFACE]["Alias"] == "fake"
+    assert objects[DEVICE_PATH][DEVICE_IFACE]["Address"] == "02:00:00:00:00:01"
+    assert objects[DEVICE_PATH][DEVICE_IFACE]["Connected"] is False
+    assert objects[CONNECTED_PATH][DEVICE_IFACE]["Connected"] is True
+    assert objects[PLAYER_PATH][PLAYER_IFACE]["Track"] == {
+        "Title": "Track 1", "Artist": "Artist", "Album": "Album",
+        "TrackNumber": 1, "Duration": 180000,
+    }
+    assert objects[TRANSPORT_PATH][TRANSPORT_IFACE]["Volume"] == 64
+
+
+def test_set_property_uses_static_signatures(backend, fake_bluez):
+    backend.set_property(adapter_path, ADAPTER_IFACE, "Alias", "kitchen")
+    backend.set_property(adapter_path, ADAPTER_IFACE, "Powered", False)
+    backend.set_property(DEVICE_PATH, DEVICE_IFACE, "Trusted", False)
+    backend.set_property(TRANSPORT_PATH, TRANSPORT_IFACE, "Volume", 100)
+
+    assert fake_bluez.adapter.values["Alias"] == "kitchen"
+    assert fake_bluez.adapter.values["Powered"] is False
+    assert fake_bluez.objects[DEVICE_PATH].values["Trusted"] is False
+    assert fake_bluez.objects[TRANSPORT_PATH].values["Volume"] == 100
+
+
+def test_set_property_rejects_undeclared_properties(backend):
+    with pytest.raises(KeyError):
+        backend.set_property(DEVICE_PATH, DEVICE_IFACE, "Blocked", True)
+
+
+def test_discovery(backend, fake_bluez):
+    backend.set_discovery_filter(
+        adapter_path, {"Transport": "bredr", "UUIDs": ["0000110a-0000-1000-8000-00805f9b34fb"], "RSSI": -90}
+    )
+    backend.start_discovery(adapter_path)
+    backend.stop_discovery(adapter_path)
+
+    assert fake_bluez.adapter.calls == [
+        ("SetDiscoveryFilter", {
+            "Transport": "bredr",
+            "UUIDs": ["0000110a-0000-1000-8000-00805f9b34fb"],
+            "RSSI": -90,
+        }),
+        ("StartDiscovery",),
+        ("StopDiscovery",),
+    ]
+
+
+def test_remove_device(backend):
+    backend.remove_device(adapter_path, DEVICE_PATH)
+
+    assert DEVICE_PATH not in backend.get_managed_objects()
+
+
+def test_error_replies_are_raised(backend, fake_bluez):
+    broken = fake_bluez.run(fake_bluez.add_device, fail_connect=True)
+
+    with pytest.raises(Exception, match="Does Not Exist"):
+        backend.remove_device(adapter_path, "/org/bluez/hci0/dev_66_66_66_66_66_66")
+    with pytest.raises(Exception, match="Page Timeout"):
+        backend.connect(broken.path, timeout=5)
+
+
+def test_connect_and_disconnect(backend, fake_bluez):
+    device = fake_bluez.objects[DEVICE_PATH]
+
+    backend.connect(DEVICE_PATH, timeout=5)
+    assert device.values["Connected"] is True
+    assert f"{DEVICE_PATH}/player0" in backend.get_managed_objects()
+
+    backend.disconnect(DEVICE_PATH, timeout=5)
+    assert device.values["Connected"] is False
+
+
+def test_player_commands(backend, fake_bluez):
+    for command in ("Play", "Pause", "Next", "Previous", "Stop"):
+        backend.player_command(PLAYER_PATH, command)
+
+    assert fake_bluez.objects[PLAYER_PATH].calls == [("Play",), ("Pause",), ("Next",), ("Previous",), ("Stop",)]
+    with pytest.raises(ValueError):
+        backend.player_command(PLAYER_PATH, "Eject")
+
+
+def test_properties_changed_is_filtered_by_arg0(backend, mainloop, signals):
+    subscribe(mainloop, backend, "org.bluez", *PROPERTIES_CHANGED, signals, arg0=DEVICE_IFACE)
+
+    backend.set_property(adapter_path, ADAPTER_IFACE, "Alias", "ignored")
+    backend.connect(DEVICE_PATH, timeout=5)
+
+    received = signals.wait(1)
+    assert len(received) == 1
+    _sender, path, interface, signal, params = received[0]
+    assert (path, interface, signal) == (DEVICE_PATH, *PROPERTIES_CHANGED)
+    assert params[0] == DEVICE_IFACE
+    assert params[1] == {"Connected": True}
+
+
+def test_interfaces_added_and_removed(backend, fake_bluez, mainloop, signals):
+    subscribe(mainloop, backend, "org.bluez", OBJECT_MANAGER, "InterfacesAdded", signals)
+    subscribe(mainloop, backend, "org.bluez", OBJECT_MANAGER, "InterfacesRemoved", signals)
+
+    device = fake_bluez.run(fake_bluez.add_device, rssi=-60)
+    path = device.path
+    backend.remove_device(adapter_path, path)
+
+    added, removed = signals.wait(2)
+    assert added[3] == "InterfacesAdded"
+    assert added[4][0] == path
+    assert added[4][1][DEVICE_IFACE]["Address"] == device.values["Address"]
+    assert added[4][1][DEVICE_IFACE]["RSSI"] == -60
+    assert removed[3] == "InterfacesRemoved"
+    assert removed[4][0] == path
+    assert DEVICE_IFACE in removed[4][1]
+
+
+def test_signals_from_other_senders_are_ignored(backend, bus_address, mainloop, signals):
+    subscribe(mainloop, backend, "org.bluez", *PROPERTIES_CHANGED, signals, arg0=DEVICE_IFACE)
+    impostor = FakeBluez(bus_address, devices=2, connected=False)
+    impostor.start()
+    try:
+        impostor.run(impostor.objects[DEVICE_PATH].update, Connected=True)
+        assert signals.wait(1, timeout=1) == []
+    finally:
+        impostor.stop()
+
+
+def test_calls_after_stop_raise_instead_of_restarting(backend):
+    if backend.name != "dbus-fast":
+        pytest.skip("pydbus calls go through the shared GLib connection")
+    backend.stop()
+
+    with pytest.raises(RuntimeError, match="stopped"):
+        backend.get_managed_objects()
+    assert backend._thread is None
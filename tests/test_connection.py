@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+pytest.importorskip("mopidy")
+
+from mopidy_bluetooth_manager.bluez_objects import DEVICE_IFACE, BluezObjectTree
+from mopidy_bluetooth_manager.connection import CONNECTED, FAILED, ConnectionManager
+
+
+class ConnectBackend():
+    """Fails Connect for every device except reachable"""
+
+    def __init__(self, reachable):
+        self.reachable = reachable
+        self.connects = []
+        self.connected = threading.Event()
+
+    def set_property(self, path, interface, name, value):
+        pass
+
+    def connect(self, device_path, timeout=None):
+        self.connects.append(device_path)
+        if device_path != self.reachable:
+            raise RuntimeError("Page Timeout")
+        self.connected.set()
+
+
+def device_path(index):
+    return f"/org/bluez/hci0/dev_00_00_00_00_00_0{index}"
+
+
+def test_autoconnect_moves_to_the_next_candidate():
+    tree = BluezObjectTree()
+    tree.seed({
+        device_path(i): {DEVICE_IFACE: {
+            "Address": f"00:00:00:00:00:0{i}", "Trusted": True, "Paired": True, "Connected": False,
+        }}
+        for i in range(3)
+    })
+    backend = ConnectBackend(reachable=device_path(2))
+    connections = ConnectionManager(
+        tree, backend, backoff_initial=0.001, backoff_max=0.001, max_attempts=2
+    )
+    try:
+        connections.start_autoconnect()
+        assert backend.connected.wait(5)
+    finally:
+        connections.stop()
+
+    assert backend.connects == [
+        device_path(0), device_path(0), device_path(1), device_path(1), device_path(2),
+    ]
+    assert connections.states() == {
+        device_path(0): FAILED, device_path(1): FAILED, device_path(2): CONNECTED,
+    }
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+pytest.importorskip("mopidy")
+
+from mopidy_bluetooth_manager.bluez_objects import DEVICE_IFACE, BluezObjectTree
+from mopidy_bluetooth_manager.device_registry import DeviceRegistry
+
+PATH = "/org/bluez/hci0/dev_AA_BB_CC_DD_EE_FF"
+ADDRESS = "AA:BB:CC:DD:EE:FF"
+
+
+def write_lines(path, records, torn=""):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records) + torn)
+
+
+def read_lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_load_merges_partial_updates(tmp_path):
+    path = tmp_path / "devices.jsonl"
+    write_lines(path, [
+        {"address": ADDRESS, "alias": "Phone", "paired": True},
+        {"address": ADDRESS, "alias": "My phone", "connections": 2},
+        {"address": "11:11:11:11:11:11", "paired": True},
+        {"address": "11:11:11:11:11:11", "removed": True},
+        {"address": "22:22:22:22:22:22", "name": "Speaker", "last_rssi": -60},
+    ], torn='{"address": "33:33')
+    registry = DeviceRegistry()
+
+    registry.load(path)
+
+    # Removed, never paired or connected, and torn entries are all dropped
+    assert registry.devices() == [
+        {"address": ADDRESS, "alias": "My phone", "paired": True, "connections": 2},
+    ]
+
+
+def test_load_compacts_a_grown_file(tmp_path):
+    path = tmp_path / "devices.jsonl"
+    write_lines(path, [
+        {"address": ADDRESS, "paired": True, "last_rssi": -40 - i} for i in range(30)
+    ])
+    registry = DeviceRegistry(compact_ratio=4)
+
+    registry.load(path)
+
+    assert read_lines(path) == [{"address": ADDRESS, "paired": True, "last_rssi": -69}]
+
+
+def test_appends_compact_once_the_file_grows(tmp_path):
+    path = tmp_path / "devices.jsonl"
+    registry = DeviceRegistry(path, compact_ratio=1)
+
+    for i in range(100):
+        registry.update(ADDRESS, paired=True, alias=f"Phone {i}")
+
+    lines = read_lines(path)
+    assert len(lines) <= 1 + 16
+    registry.load(path)
+    assert registry.get(ADDRESS)["alias"] == "Phone 99"
+
+
+def test_small_rssi_changes_are_not_written(tmp_path):
+    path = tmp_path / "devices.jsonl"
+    registry = DeviceRegistry(path)
+
+    registry.update(ADDRESS, paired=True, last_rssi=-50)
+    registry.update(ADDRESS, last_rssi=-55)
+    registry.update(ADDRESS, last_rssi=-65)
+
+    assert [line.get("last_rssi") for line in read_lines(path)] == [-50, -65]
+    assert registry.get(ADDRESS)["last_rssi"] == -65
+
+
+def test_only_paired_or_connected_devices_are_recorded():
+    tree = BluezObjectTree()
+    registry = DeviceRegistry(object_tree=tree)
+    tree.add_listener(registry.on_object_event)
+
+    tree.interfaces_added(PATH, {DEVICE_IFACE: {
+        "Address": ADDRESS, "Alias": "Phone", "Paired": False, "RSSI": -50,
+    }})
+    assert registry.get(ADDRESS) is None
+
+    tree.properties_changed(PATH, DEVICE_IFACE, {"Paired": True})
+    device = registry.get(ADDRESS)
+    assert device["alias"] == "Phone"
+    assert device["paired"] is True
+    assert device["first_seen"]
+
+
+def test_unpaired_devices_are_forgotten_when_bluez_removes_them():
+    tree = BluezObjectTree()
+    registry = DeviceRegistry(object_tree=tree)
+    tree.add_listener(registry.on_object_event)
+    tree.interfaces_added(PATH, {DEVICE_IFACE: {"Address": ADDRESS, "Connected": True}})
+    assert registry.get(ADDRESS)["connections"] == 1
+
+    tree.interfaces_removed(PATH, [DEVICE_IFACE])
+
+    assert registry.get(ADDRESS) is None
@@ -0,0 +1,124 @@
+import pytest
+
+pytest.importorskip("mopidy")
+
+from mopidy_bluetooth_manager import discovery
+from mopidy_bluetooth_manager.bluez_objects import DEVICE_IFACE, BluezObjectTree
+from mopidy_bluetooth_manager.discovery import A2DP_SOURCE_UUID, DiscoveryManager
+
+HID_UUID = "00001124-0000-1000-8000-00805f9b34fb"
+
+
+def device(index, rssi=-50, uuids=(A2DP_SOURCE_UUID,), **props):
+    address = f"00:00:00:00:00:{index:02X}"
+    return (
+        f"/org/bluez/hci0/dev_{address.replace(':', '_')}",
+        {"Address": address, "Name": f"Phone {index}", "RSSI": rssi, "UUIDs": list(uuids), **props},
+    )
+
+
+class Scan():
+    def __init__(self):
+        self.starts = 0
+        self.stops = 0
+
+    def start(self):
+        self.starts += 1
+
+    def stop(self):
+        self.stops += 1
+
+
+@pytest.fixture
+def tree():
+    return BluezObjectTree()
+
+
+@pytest.fixture
+def manager(tree):
+    manager = DiscoveryManager(tree)
+    manager.configure({
+        "discovery_transport": "bredr",
+        "discovery_uuids": [A2DP_SOURCE_UUID.upper()],
+        "discovery_rssi": -80,
+    })
+    return manager
+
+
+@pytest.fixture
+def scan():
+    return Scan()
+
+
+def test_scan_filter(manager):
+    assert manager.scan_filter() == {
+        "Transport": "bredr", "UUIDs": [A2DP_SOURCE_UUID], "RSSI": -80,
+    }
+
+
+def test_accepts(manager):
+    assert manager.accepts(device(1)[1])
+    assert manager.accepts(device(1, uuids=())[1])
+    assert not manager.accepts(device(1, rssi=-90)[1])
+    assert not manager.accepts(device(1, uuids=(HID_UUID,))[1])
+
+
+def test_devices_are_streamed_into_the_session(manager, tree, scan):
+    session = manager.start(scan.start, scan.stop, count=2)
+    assert session["devices"] == []
+
+    path, props = device(1)
+    tree.interfaces_added(path, {DEVICE_IFACE: props})
+    first = manager.poll(session["session_id"])
+    assert [found["device_path"] for found in first["devices"]] == [path]
+    assert not first["done"]
+
+    path, props = device(2, rssi=-40)
+    tree.interfaces_added(path, {DEVICE_IFACE: props})
+    done = manager.poll(session["session_id"], since=first["next"])
+    assert [found["address"] for found in done["devices"]] == ["00:00:00:00:00:02"]
+    assert [found["address"] for found in done["ranked"]] == ["00:00:00:00:00:02", "00:00:00:00:00:01"]
+    assert (done["done"], done["reason"]) == (True, "found")
+    assert (scan.starts, scan.stops) == (1, 1)
+
+
+def test_filtered_devices_are_not_offered(manager, tree, scan):
+    session = manager.start(scan.start, scan.stop)
+    for index, props in ((1, {"rssi": -90}), (2, {"uuids": (HID_UUID,)})):
+        path, device_props = device(index, **props)
+        tree.interfaces_added(path, {DEVICE_IFACE: device_props})
+
+    assert manager.stop(session["session_id"])["devices"] == []
+
+
+def test_known_devices_can_satisfy_a_session_at_once(manager, tree, scan):
+    path, props = device(1)
+    tree.seed({path: {DEVICE_IFACE: props}})
+
+    session = manager.start(scan.start, scan.stop, address="00:00:00:00:00:01")
+
+    assert (session["done"], session["reason"]) == (True, "found")
+    assert scan.stops == 1
+
+
+def test_sessions_share_one_scan(manager, scan):
+    first = manager.start(scan.start, scan.stop)
+    second = manager.start(scan.start, scan.stop)
+
+    manager.stop(first["session_id"])
+    assert (scan.starts, scan.stops) == (1, 0)
+    manager.stop(second["session_id"])
+    assert (scan.starts, scan.stops) == (1, 1)
+
+
+def test_finished_sessions_expire_in_completion_order(manager, scan, monkeypatch):
+    monkeypatch.setattr(discovery, "max_finished_sessions", 1)
+    first = manager.start(scan.start, scan.stop)
+    second = manager.start(scan.start, scan.stop)
+
+    manager.stop(second["session_id"])
+    manager.stop(first["session_id"])
+
+    assert manager.poll(first["session_id"])["reason"] == "stopped"
+    with pytest.raises(RuntimeError):
+        manager.poll(second["session_id"])
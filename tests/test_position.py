@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("mopidy")
+
+from mopidy_bluetooth_manager.bluez_objects import PLAYER_IFACE, BluezObjectTree
+from mopidy_bluetooth_manager.position import PlayerClocks
+
+PLAYER_PATH = "/org/bluez/hci0/dev_AA_BB_CC_DD_EE_FF/player0"
+
+
+@pytest.fixture
+def tree():
+    return BluezObjectTree()
+
+
+@pytest.fixture
+def clocks(tree):
+    clocks = PlayerClocks(tree)
+    tree.add_listener(clocks.on_object_event)
+    return clocks
+
+
+def test_seek_is_seen_on_an_added_player_without_polling(tree, clocks):
+    tree.interfaces_added(PLAYER_PATH, {
+        PLAYER_IFACE: {"Position": 0, "Status": "playing", "Track": {"Duration": 300000}},
+    })
+    tree.properties_changed(PLAYER_PATH, PLAYER_IFACE, {"Position": 120000})
+
+    assert clocks.take_seek(PLAYER_PATH) == 120000
+    assert clocks.take_seek(PLAYER_PATH) is None
+
+
+def test_seek_is_seen_on_a_seeded_player_after_its_first_update(tree, clocks):
+    tree.seed({PLAYER_PATH: {PLAYER_IFACE: {"Position": 0, "Status": "playing"}}})
+    tree.properties_changed(PLAYER_PATH, PLAYER_IFACE, {"Status": "paused"})
+    tree.properties_changed(PLAYER_PATH, PLAYER_IFACE, {"Position": 120000})
+
+    assert clocks.take_seek(PLAYER_PATH) == 120000
+
+
+def test_small_corrections_and_track_changes_are_not_seeks(tree, clocks):
+    tree.interfaces_added(PLAYER_PATH, {PLAYER_IFACE: {"Position": 5000, "Status": "paused"}})
+    tree.properties_changed(PLAYER_PATH, PLAYER_IFACE, {"Position": 5800})
+    tree.properties_changed(PLAYER_PATH, PLAYER_IFACE, {
+        "Position": 0, "Track": {"Title": "Next", "Duration": 200000},
+    })
+
+    assert clocks.take_seek(PLAYER_PATH) is None
+    assert clocks.position(PLAYER_PATH, {}) == 0
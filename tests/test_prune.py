@@ -0,0 +1,68 @@
+import pytest
+
+pytest.importorskip("mopidy")
+
+from mopidy_bluetooth_manager.bluez_objects import DEVICE_IFACE, BluezObjectTree
+from mopidy_bluetooth_manager.device_registry import DeviceRegistry
+from mopidy_bluetooth_manager.prune import DevicePruner
+
+DAY = 24 * 3600
+NOW = 1_000 * DAY
+
+
+def path_of(name):
+    return f"/org/bluez/hci0/dev_{name}"
+
+
+@pytest.fixture
+def pruner():
+    tree = BluezObjectTree()
+    devices = {
+        # name: (Paired, Trusted, Connected, last connected days ago)
+        "connected": (True, True, True, 90),
+        "recent": (True, True, False, 1),
+        "old": (True, True, False, 60),
+        "older": (True, False, False, 120),
+        "unknown": (True, True, False, None),
+        "unpaired": (False, False, False, None),
+    }
+    registry = DeviceRegistry()
+    objects = {}
+    for name, (paired, trusted, connected, days) in devices.items():
+        objects[path_of(name)] = {DEVICE_IFACE: {
+            "Address": name, "Paired": paired, "Trusted": trusted, "Connected": connected,
+        }}
+        if days is not None:
+            registry.update(name, last_connected=NOW - days * DAY)
+    tree.seed(objects)
+    pruner = DevicePruner(tree, registry, remove=lambda path: None)
+    yield pruner
+    pruner.stop()
+
+
+def test_max_age_removes_old_and_unpaired_devices_oldest_first(pruner):
+    assert pruner.candidates(max_age=30 * DAY, now=NOW) == [
+        path_of("unpaired"), path_of("older"), path_of("old"),
+    ]
+
+
+def test_max_devices_keeps_the_most_recently_used(pruner):
+    assert pruner.candidates(max_devices=2, now=NOW) == [path_of("unpaired"), path_of("older")]
+
+
+def test_keep_trusted_spares_trusted_devices(pruner):
+    assert pruner.candidates(max_age=30 * DAY, keep_trusted=True, now=NOW) == [
+        path_of("unpaired"), path_of("older"),
+    ]
+
+
+def test_paired_devices_without_history_are_never_candidates(pruner):
+    assert path_of("unknown") not in pruner.candidates(max_devices=0, now=NOW)
+
+
+def test_first_seen_counts_for_devices_that_never_connected(pruner):
+    pruner.history.update("unknown", first_seen=NOW - 200 * DAY)
+
+    assert pruner.candidates(max_age=30 * DAY, now=NOW)[:2] == [
+        path_of("unpaired"), path_of("unknown"),
+    ]